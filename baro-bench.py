@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+python 3.11+ script; depends on Pillow and whatever baro-data.py depends on.
+
+writes synthetic content packages, vanilla and some mods, and times
+baro-data.py building bundles from them
+
+    python3 baro-bench.py generate /tmp/bench --items 2000 --mods 10
+    python3 baro-bench.py run /tmp/bench --repeat 3
+    python3 baro-bench.py run /tmp/bench --save before.json -- --sprites atlas
+    python3 baro-bench.py run /tmp/bench --compare before.json -- --sprites atlas
+    python3 baro-bench.py run /tmp/bench --max-rss 512
+
+each run is a separate process, so peak RSS is per run
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+from contextlib import redirect_stderr
+from pathlib import Path
+from resource import getrusage, RUSAGE_SELF, RUSAGE_CHILDREN
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import monotonic_ns
+
+
+LANGUAGES = ("English", "German", "French", "Russian", "Japanese", "Polish")
+
+TAGS = ("smallitem", "mediumitem", "metal", "chem", "tool", "weapon", "medical")
+
+SPRITE_SIZE = 64
+SHEET_COLUMNS = 8
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # fmt: off
+    generate = commands.add_parser("generate", help="write synthetic content packages")
+    generate.add_argument("path", type=Path, help="directory to write Content/ and mods/ to")
+    generate.add_argument("--items", type=int, default=2000, help="number of vanilla items")
+    generate.add_argument("--items-per-file", type=int, default=100, help="vanilla items per xml file and texture sheet")
+    generate.add_argument("--mods", type=int, default=5, help="number of mods")
+    generate.add_argument("--mod-items", type=int, default=200, help="number of items in each mod")
+    generate.add_argument("--languages", type=int, default=3, help=f"number of languages, at most {len(LANGUAGES)}")
+    generate.add_argument("--variants", type=float, default=0.2, help="fraction of items that are a variant of another")
+    generate.add_argument("--seed", type=int, default=1)
+
+    run = commands.add_parser("run", help="time baro-data.py on generated content packages")
+    run.add_argument("path", type=Path, help="directory given to generate")
+    run.add_argument("--baro-data", type=Path, default=Path(__file__).parent / "baro-data.py")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--load-orders", choices=["vanilla", "each", "all"], nargs="+", default=["vanilla", "all"], help="vanilla alone, each mod alone, all mods together")
+    run.add_argument("--save", type=Path, help="write results as json to this file")
+    run.add_argument("--compare", type=Path, help="show the difference from results written with --save")
+    run.add_argument("--verbose", "-v", action="store_true", help="show baro-data.py output")
+    run.add_argument("--max-rss", type=int, help="MiB; passed to baro-data.py, and fails if a run's peak rss is over it")
+
+    once = commands.add_parser("once", help=argparse.SUPPRESS)
+    once.add_argument("--baro-data", type=Path, required=True)
+    once.add_argument("--verbose", "-v", action="store_true")
+    # fmt: on
+
+    # anything after -- is for baro-data.py
+    argv = sys.argv[1:]
+    baro_args: list[str] = []
+    if "--" in argv:
+        i = argv.index("--")
+        argv, baro_args = argv[:i], argv[i + 1 :]
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate_content(
+            args.path,
+            items=args.items,
+            items_per_file=args.items_per_file,
+            mods=args.mods,
+            mod_items=args.mod_items,
+            languages=LANGUAGES[: args.languages],
+            variants=args.variants,
+            seed=args.seed,
+        )
+
+    elif args.command == "run":
+        run_benchmark(args, baro_args)
+
+    elif args.command == "once":
+        run_once(args.baro_data, baro_args, args.verbose)
+
+
+# generating
+
+
+def generate_content(
+    root: Path,
+    *,
+    items: int,
+    items_per_file: int,
+    mods: int,
+    mod_items: int,
+    languages: tuple[str, ...],
+    variants: float,
+    seed: int,
+):
+    rng = random.Random(seed)
+
+    content = root / "Content"
+    vanilla_ids = [f"item{i}" for i in range(items)]
+    stations = ["fabricator", "deconstructor", "medicalfabricator"]
+    files = []
+
+    for n, start in enumerate(range(0, items, items_per_file)):
+        ids = vanilla_ids[start : start + items_per_file]
+        directory = content / "Items" / f"Category{n}"
+        directory.mkdir(parents=True, exist_ok=True)
+
+        _write_sheet(rng, directory / "sheet.png", len(ids))
+
+        # vanilla uses paths from the Content/ directory or, sometimes, paths
+        # relative to the item xml file
+        if n % 2:
+            texture = "sheet.png"
+        else:
+            texture = f"Content/Items/Category{n}/sheet.png"
+
+        xml = _items_xml(
+            rng,
+            ids,
+            texture=texture,
+            known=vanilla_ids + stations,
+            # variants of items in earlier files and earlier in this file,
+            # so some are variants of variants
+            variant_of=vanilla_ids,
+            offset=start,
+            variants=variants,
+        )
+        (directory / f"category{n}.xml").write_text(xml)
+        files.append(f'<Item file="Content/Items/Category{n}/category{n}.xml" />')
+
+    directory = content / "Items" / "Stations"
+    directory.mkdir(parents=True, exist_ok=True)
+    _write_sheet(rng, directory / "stations.png", len(stations))
+    (directory / "stations.xml").write_text(
+        _stations_xml(stations, "Content/Items/Stations/stations.png")
+    )
+    files.append('<Item file="Content/Items/Stations/stations.xml" />')
+
+    for language in languages:
+        directory = content / "Texts" / language
+        directory.mkdir(parents=True, exist_ok=True)
+        xml = _texts_xml(rng, language, vanilla_ids + stations)
+        (directory / f"{language}Vanilla.xml").write_text(xml)
+        files.append(f'<Text file="Content/Texts/{language}/{language}Vanilla.xml" />')
+
+    # other xml files, that aren't content packages, for discovery to skip
+    directory = content / "Map"
+    directory.mkdir(parents=True, exist_ok=True)
+    for n in range(items // 10):
+        (directory / f"map{n}.xml").write_text(
+            "<Map>" + "<Thing />" * rng.randint(1, 100) + "</Map>"
+        )
+
+    (content / "ContentPackages").mkdir(parents=True, exist_ok=True)
+    (content / "ContentPackages" / "Vanilla.xml").write_text(
+        _contentpackage_xml(
+            'name="Vanilla" gameversion="1.5.0.0" corepackage="true"', files
+        )
+    )
+
+    for m in range(mods):
+        workshop_id = str(3000000000 + m)
+        directory = root / "mods" / workshop_id
+        (directory / "Items").mkdir(parents=True, exist_ok=True)
+
+        ids = [f"mod{m}item{i}" for i in range(mod_items)]
+        _write_sheet(rng, directory / "Items" / "sheet.png", len(ids))
+
+        # some mods override vanilla items
+        overrides = rng.sample(vanilla_ids, min(len(vanilla_ids), mod_items // 20))
+
+        xml = _items_xml(
+            rng,
+            ids,
+            texture="%ModDir%/Items/sheet.png",
+            known=vanilla_ids + stations + ids,
+            variant_of=vanilla_ids + ids,
+            offset=len(vanilla_ids),
+            variants=variants,
+            overrides=overrides,
+        )
+        (directory / "Items" / "items.xml").write_text(xml)
+        files = ['<Item file="%ModDir%/Items/items.xml" />']
+
+        (directory / "Texts").mkdir(parents=True, exist_ok=True)
+        for language in languages[: rng.randint(1, len(languages))]:
+            xml = _texts_xml(rng, language, ids)
+            (directory / "Texts" / f"{language}.xml").write_text(xml)
+            files.append(f'<Text file="%ModDir%/Texts/{language}.xml" />')
+
+        (directory / "filelist.xml").write_text(
+            _contentpackage_xml(
+                f'name="Mod {m}" modversion="1.0.{m}"'
+                f' steamworkshopid="{workshop_id}" gameversion="1.5.0.0"',
+                files,
+            )
+        )
+
+    print(
+        f"wrote {items} vanilla items, {mods} mods of {mod_items} items,"
+        f" in {len(languages)} languages, to {root}",
+        file=sys.stderr,
+    )
+
+
+def _write_sheet(rng: random.Random, path: Path, n: int):
+    from PIL import Image, ImageDraw
+
+    rows = (n + SHEET_COLUMNS - 1) // SHEET_COLUMNS
+    size = (SHEET_COLUMNS * SPRITE_SIZE, max(1, rows) * SPRITE_SIZE)
+    sheet = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sheet)
+
+    for i in range(n):
+        x = (i % SHEET_COLUMNS) * SPRITE_SIZE
+        y = (i // SHEET_COLUMNS) * SPRITE_SIZE
+        pad = rng.randint(2, SPRITE_SIZE // 4)
+        fill = (rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)
+        draw.ellipse(
+            [x + pad, y + pad, x + SPRITE_SIZE - pad, y + SPRITE_SIZE - pad // 2],
+            fill=fill,
+        )
+
+    sheet.save(path)
+
+
+def _sourcerect(i: int) -> str:
+    x = (i % SHEET_COLUMNS) * SPRITE_SIZE
+    y = (i // SHEET_COLUMNS) * SPRITE_SIZE
+    return f"{x},{y},{SPRITE_SIZE},{SPRITE_SIZE}"
+
+
+def _items_xml(
+    rng: random.Random,
+    ids: list[str],
+    *,
+    texture: str,
+    known: list[str],
+    variant_of: list[str],
+    offset: int,
+    variants: float,
+    overrides: list[str] = [],
+) -> str:
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', "<Items>"]
+
+    for i, identifier in enumerate(ids):
+        attrs = f'identifier="{identifier}" tags="{",".join(rng.sample(TAGS, 2))}"'
+
+        # item i is variant_of[offset + i], it can be a variant of anything
+        # before that, so there are chains but no cycles
+        if offset + i and rng.random() < variants:
+            attrs += f' variantof="{variant_of[rng.randrange(offset + i)]}"'
+            # some variants only change attributes, others replace parts
+            if rng.random() < 0.5:
+                lines.append(f"  <Item {attrs} />")
+                continue
+
+        lines.append(f"  <Item {attrs}>")
+        lines.extend(_item_children(rng, texture, _sourcerect(i), known))
+        lines.append("  </Item>")
+
+    if overrides:
+        lines.append("  <Override>")
+        for identifier in overrides:
+            lines.append(f'  <Item identifier="{identifier}" tags="override">')
+            lines.extend(_item_children(rng, texture, _sourcerect(0), known))
+            lines.append("  </Item>")
+        lines.append("  </Override>")
+
+    lines.append("</Items>")
+    return "\n".join(lines)
+
+
+def _item_children(
+    rng: random.Random, texture: str, sourcerect: str, known: list[str]
+) -> list[str]:
+    lines = [
+        f'    <Sprite texture="{texture}" sourcerect="{sourcerect}" depth="0.5" />',
+        '    <Body width="10" height="10" density="5" />',
+        '    <StatusEffect type="OnUse" target="This">'
+        '<Explosion range="100" /></StatusEffect>',
+    ]
+
+    for _ in range(rng.choice((0, 1, 1, 1, 2))):
+        required = "".join(
+            f'<RequiredItem identifier="{rng.choice(known)}"'
+            f' amount="{rng.randint(1, 3)}" />'
+            for _ in range(rng.randint(1, 4))
+        )
+        if rng.random() < 0.2:
+            required += '<RequiredItem tag="metal" mincondition="0.5" />'
+        lines.append(
+            '    <Fabricate suitablefabricators="fabricator"'
+            f' requiredtime="{rng.randint(1, 30)}">'
+            f'<RequiredSkill identifier="mechanical" level="{rng.randint(0, 60)}" />'
+            f"{required}</Fabricate>"
+        )
+
+    if rng.random() < 0.5:
+        outputs = "".join(
+            f'<Item identifier="{rng.choice(known)}"'
+            f' commonness="{rng.randint(1, 3)}" />'
+            for _ in range(rng.randint(1, 3))
+        )
+        chooserandom = ' chooserandom="true"' if rng.random() < 0.1 else ""
+        lines.append(
+            f'    <Deconstruct time="{rng.randint(1, 10)}"{chooserandom}>'
+            f"{outputs}</Deconstruct>"
+        )
+
+    if rng.random() < 0.4:
+        lines.append(
+            f'    <Price baseprice="{rng.randint(10, 500)}" sold="true">'
+            '<Price storeidentifier="merchantoutpost" />'
+            '<Price locationtype="city" sold="false" /></Price>'
+        )
+
+    return lines
+
+
+def _stations_xml(stations: list[str], texture: str) -> str:
+    lines = ["<Items>"]
+    for i, identifier in enumerate(stations):
+        lines.append(
+            f'  <Item identifier="{identifier}" tags="station">'
+            f'<Sprite texture="{texture}" sourcerect="{_sourcerect(i)}" /></Item>'
+        )
+    lines.append("</Items>")
+    return "\n".join(lines)
+
+
+def _texts_xml(rng: random.Random, language: str, ids: list[str]) -> str:
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        f'<infotexts language="{language}" translatedname="{language}">',
+        "  <fabricatorrequiresrecipe>Requires a recipe</fabricatorrequiresrecipe>",
+        "  <npctitle.merchantoutpost>Outpost merchant</npctitle.merchantoutpost>",
+    ]
+
+    for identifier in ids:
+        words = " ".join("blah" for _ in range(rng.randint(5, 40)))
+        name = f"entityname.{identifier}"
+        description = f"entitydescription.{identifier}"
+        lines.append(f"  <{name}>{identifier}</{name}>")
+        lines.append(f"  <{description}>{words}</{description}>")
+
+    lines.append("</infotexts>")
+    return "\n".join(lines)
+
+
+def _contentpackage_xml(attrs: str, files: list[str]) -> str:
+    return "\n".join(
+        [
+            '<?xml version="1.0" encoding="utf-8"?>',
+            f"<contentpackage {attrs}>",
+            *(f"  {f}" for f in files),
+            "</contentpackage>",
+        ]
+    )
+
+
+# running
+
+
+def run_benchmark(args, extra_args: list[str]):
+    mods = sorted(p for p in (args.path / "mods").iterdir() if p.is_dir())
+
+    baro_args = ["--content", str(args.path / "Content"), *map(str, mods)]
+
+    if "vanilla" in args.load_orders:
+        baro_args += ["--named-load-order", "vanilla"]
+    if "each" in args.load_orders:
+        for mod in mods:
+            baro_args += ["--named-load-order", f"mod-{mod.name}", mod.name]
+    if "all" in args.load_orders:
+        baro_args += ["--named-load-order", "all", *(mod.name for mod in mods)]
+
+    if args.max_rss:
+        baro_args += ["--max-rss", str(args.max_rss)]
+
+    baro_args += extra_args
+
+    runs = []
+
+    for n in range(args.repeat):
+        # fmt: off
+        command = [
+            sys.executable, __file__, "once",
+            "--baro-data", str(args.baro_data),
+            *(["--verbose"] if args.verbose else []),
+            "--", *baro_args,
+        ]
+        # fmt: on
+        result = subprocess.run(command, stdout=subprocess.PIPE)
+        if result.returncode != 0:
+            raise SystemExit(f"run {n + 1}/{args.repeat} failed » {result.returncode}")
+        runs.append(json.loads(result.stdout))
+        total = runs[-1]["total"] / 1e6
+        print(f"run {n + 1}/{args.repeat} » {total:.0f}ms", file=sys.stderr)
+
+    summary = summarize(runs)
+
+    compare = None
+    if args.compare:
+        compare = json.loads(args.compare.read_text())["summary"]
+
+    print_summary(summary, compare)
+
+    if args.save:
+        saved = {"args": baro_args, "runs": runs, "summary": summary}
+        args.save.write_text(json.dumps(saved))
+
+    peak = summary["peak rss MiB"]["max"]
+    if args.max_rss and peak > args.max_rss:
+        raise SystemExit(f"peak rss {peak:.1f}MiB is over --max-rss {args.max_rss}MiB")
+
+
+def run_once(baro_data: Path, argv: list[str], verbose: bool):
+    """runs baro-data.py's main() in this process, prints times and rss as json"""
+    spec = importlib.util.spec_from_file_location("baro_data", baro_data)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    # so worker processes can find functions by module name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+
+    with TemporaryDirectory() as output:
+        sys.argv = [str(baro_data), "--output", output, *argv]
+
+        with open(os.devnull, "w") as devnull:
+            with redirect_stderr(sys.stderr if verbose else devnull):
+                start = monotonic_ns()
+                module.main()
+                module.stage(None)
+                total = monotonic_ns() - start
+
+        written = sum(p.stat().st_size for p in Path(output).iterdir())
+
+    result = {
+        "total": total,
+        "stages": module.STAGE_NS,
+        # the order baro-data.py goes through its stages in
+        "order": module.STAGES,
+        # kibibytes on linux
+        "maxrss": getrusage(RUSAGE_SELF).ru_maxrss,
+        "children_maxrss": getrusage(RUSAGE_CHILDREN).ru_maxrss,
+        "written": written,
+    }
+    print(json.dumps(result))
+
+
+def summarize(runs: list[dict]) -> dict:
+    """{stage: {min, median, max}} in ms, plus total and rss in MiB"""
+    order = runs[0]["order"] if runs else []
+    stages = [s for s in order if any(s in run["stages"] for run in runs)]
+    stages += sorted({s for run in runs for s in run["stages"]} - set(stages))
+
+    summary = {}
+
+    for name in stages:
+        times = [run["stages"].get(name, 0) / 1e6 for run in runs]
+        summary[name] = {"min": min(times), "median": median(times), "max": max(times)}
+
+    times = [run["total"] / 1e6 for run in runs]
+    summary["total"] = {"min": min(times), "median": median(times), "max": max(times)}
+
+    rss = [max(run["maxrss"], run["children_maxrss"]) / 1024 for run in runs]
+    summary["peak rss MiB"] = {"min": min(rss), "median": median(rss), "max": max(rss)}
+
+    return summary
+
+
+def print_summary(summary: dict, compare: dict | None = None):
+    header = f"{'':14} {'min':>10} {'median':>10} {'max':>10}"
+    if compare is not None:
+        header += f" {'was':>10} {'change':>8}"
+    print(header)
+
+    for name, values in summary.items():
+        line = f"{name:14} " + " ".join(
+            f"{values[k]:10.1f}" for k in ("min", "median", "max")
+        )
+        if compare is not None and (before := compare.get(name)) is not None:
+            was = before["median"]
+            change = (values["median"] - was) / was if was else 0.0
+            line += f" {was:10.1f} {change:+8.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
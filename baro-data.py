@@ -2,24 +2,37 @@
 python 3.11+ script; depends on Pillow and lxml.
 """
 
+import gc
 import json
 import os
+import pickle
 import re
+import socket
+import struct
 import sys
+import tarfile
 from base64 import b64encode
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from copy import copy
-from dataclasses import dataclass, is_dataclass, fields, asdict
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from copy import copy, deepcopy
+from dataclasses import MISSING, dataclass, is_dataclass, field, fields, asdict
 from graphlib import TopologicalSorter
+from hashlib import file_digest, sha1
 from io import BytesIO, StringIO
-from itertools import count, chain, repeat
+from itertools import count, chain
 from lxml import etree
+from multiprocessing import get_context
 from operator import ior
 from pathlib import Path
 from functools import partial, reduce
-from threading import Lock
+from threading import Lock, get_ident
 from typing import (
+    Any,
     Union,
     NewType,
     TypeAlias,
@@ -31,7 +44,11 @@ from typing import (
     Literal,
     TYPE_CHECKING,
 )
-from time import monotonic_ns
+from resource import getpagesize, getrusage, RUSAGE_SELF, RUSAGE_CHILDREN
+from select import select
+from tempfile import TemporaryDirectory
+from time import monotonic_ns, sleep
+from traceback import print_exc
 
 if TYPE_CHECKING:
     import PIL
@@ -41,6 +58,10 @@ _CHECK_SPRITE_DUPE = False
 
 _CHECK_L10N_MISSING = False
 
+# "attributes on element were not used"; finding those costs a little for every
+# element extracted
+_CHECK_UNUSED_ATTRIBUTES = True
+
 PACKAGE_ORIGIN_KEY = "__package-origin"
 PACKAGE_RELATIVE_KEY = "__package-relative-path"
 
@@ -151,6 +172,169 @@ def logtime(message):
     _LAST_TIME = monotonic_ns()
 
 
+STAGES = ("discovery", "parse", "variants", "processes", "sprites", "i18n", "write")
+
+# {stage: ns} time between entering a stage and entering the next one
+STAGE_NS: dict[str, int] = {}
+
+# [{"stage": name, "ms": ..., "maxrss_kib": ..., **context, **counts}, ...]
+STAGE_RECORDS: list[dict] = []
+
+_STAGE: tuple[str, int, dict] | None = None
+
+
+def stage(name: str | None, **context):
+    """stop timing the current stage, if any, and start timing `name`
+
+    stages can be entered more than once, like for each load order, the times
+    are summed; None ends the current stage without starting another
+
+    each entry gets a record in STAGE_RECORDS, with context and stage_count()s
+    """
+    global _STAGE
+
+    now = monotonic_ns()
+
+    if _STAGE is not None:
+        current, start, record = _STAGE
+        STAGE_NS[current] = STAGE_NS.get(current, 0) + now - start
+        record["ms"] = (now - start) / 1e6
+        record["maxrss_kib"] = getrusage(RUSAGE_SELF).ru_maxrss
+
+        if _PROFILER is not None and _PROFILER.stage == current:
+            _PROFILER.stop()
+
+    if name is None:
+        _STAGE = None
+        return
+
+    record = {"stage": name, **context}
+    STAGE_RECORDS.append(record)
+
+    check_rss(name)
+
+    if _PROFILER is not None and _PROFILER.stage == name:
+        _PROFILER.start()
+
+    _STAGE = (name, monotonic_ns(), record)
+
+
+# bytes, see --max-rss
+_MAX_RSS: int | None = None
+
+
+def current_rss() -> int:
+    """bytes resident for this process, not counting worker processes; or the
+    peak so far if /proc isn't around"""
+    try:
+        with open("/proc/self/statm", "rb") as file:
+            return int(file.read().split()[1]) * getpagesize()
+    except (OSError, ValueError, IndexError):
+        return getrusage(RUSAGE_SELF).ru_maxrss << 10
+
+
+def check_rss(where: str):
+    """if over --max-rss, drop decoded textures; exits if that isn't enough"""
+    if _MAX_RSS is None or current_rss() <= _MAX_RSS:
+        return
+
+    _TEXTURE_CACHE.clear()
+    gc.collect()
+
+    if (rss := current_rss()) > _MAX_RSS:
+        log_warning(
+            "over --max-rss",
+            stage=where,
+            rss_mib=rss >> 20,
+            max_rss_mib=_MAX_RSS >> 20,
+        )
+        raise SystemExit(1)
+
+
+def stage_count(**counts: int):
+    """add to counts in the current stage's record"""
+    if _STAGE is not None:
+        record = _STAGE[2]
+        for key, n in counts.items():
+            record[key] = record.get(key, 0) + n
+
+
+class StageProfiler(object):
+    """
+    profiles a stage each time it's entered, dump() writes the profile
+
+    cprofile writes pstats, for `python -m pstats` or snakeviz or whatever;
+    tracemalloc writes text of the lines that allocated the most during each
+    entry to the stage; neither see into worker processes
+    """
+
+    def __init__(self, stage: str, kind: str, path: Path):
+        self.stage = stage
+        self.kind = kind
+        self.path = path
+        self.entries = 0
+        self.report = StringIO()
+
+        if kind == "cprofile":
+            import cProfile
+
+            self.profile = cProfile.Profile()
+
+    def start(self):
+        self.entries += 1
+
+        if self.kind == "cprofile":
+            self.profile.enable()
+
+        elif self.kind == "tracemalloc":
+            import tracemalloc
+
+            tracemalloc.start()
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def stop(self):
+        if self.kind == "cprofile":
+            self.profile.disable()
+
+        elif self.kind == "tracemalloc":
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{self.stage} #{self.entries} » peak {peak}B", file=self.report)
+            for stat in snapshot.compare_to(self.snapshot, "lineno")[:30]:
+                print(f"  {stat}", file=self.report)
+
+    def dump(self):
+        if self.kind == "cprofile":
+            self.profile.dump_stats(self.path)
+        else:
+            self.path.write_text(self.report.getvalue())
+
+
+_PROFILER: StageProfiler | None = None
+
+
+def write_metrics(path: Path):
+    self = getrusage(RUSAGE_SELF)
+    children = getrusage(RUSAGE_CHILDREN)
+    metrics = {
+        "argv": sys.argv[1:],
+        "stages": STAGE_RECORDS,
+        "total_ms": {name: ns / 1e6 for name, ns in STAGE_NS.items()},
+        "maxrss_kib": self.ru_maxrss,
+        "children_maxrss_kib": children.ru_maxrss,
+        "cpu_s": self.ru_utime + self.ru_stime,
+        "children_cpu_s": children.ru_utime + children.ru_stime,
+        "warnings": len(_WARNINGS),
+        "warning_repeats": _WARNINGS.repeats,
+    }
+    with path.open("w") as file:
+        json.dump(metrics, file, indent=1)
+
+
 class Error(Exception):
     def __init__(self, **kwargs):
         super().__init__(kwargs)
@@ -208,19 +392,227 @@ def log_warnings(it, *, path=None):
 
 
 def log_warning(message, **kwargs):
-    print(ansi.magenta(message), file=sys.stderr)
+    _WARNINGS.add(message, kwargs)
 
-    for key, value in kwargs.items():
-        prefix = f"\t» {ansi.blue(key)} "
-        value = format_log_value(value, path=kwargs.get("path"))
 
-        if "\n" in value:
-            print(f"{prefix}...\n{value}", file=sys.stderr)
-        else:
-            print(f"{prefix}{value}", file=sys.stderr)
+@dataclass(slots=True)
+class WarningRecord(object):
+    """a logged warning, its values are kept as they are until it's printed"""
+
+    message: Any
+    kwargs: dict[str, Any]
+    # where the warning is about, if known
+    path: Any = None
+    line: int | None = None
+    # times this was logged
+    count: int = 1
+
+    def print(self, file=None):
+        """
+        once printed, values are copied on their own so that a record kept for
+        the whole run doesn't keep the tree they're from alive
+        """
+        if file is None:
+            file = sys.stderr
+
+        print(ansi.magenta(self.message), file=file)
+
+        for key, value in self.kwargs.items():
+            prefix = f"\t» {ansi.blue(key)} "
+            value = format_log_value(value, path=self.kwargs.get("path"))
+
+            if "\n" in value:
+                print(f"{prefix}...\n{value}", file=file)
+            else:
+                print(f"{prefix}{value}", file=file)
+
+        self.kwargs = {k: _detached_warning_value(v) for k, v in self.kwargs.items()}
+
+    def to_json(self) -> dict:
+        path = None if self.path is None else str(self.path)
+        return {
+            "message": str(self.message),
+            "path": path,
+            "line": self.line,
+            "count": self.count,
+            "values": _warning_values(self.kwargs, path),
+        }
+
+
+class WarningSink(object):
+    """
+    collects warnings as they're logged; a warning logged again about the same
+    message and place is counted instead of printed again, so building load
+    orders that share packages doesn't repeat the same warnings
+
+    with quiet, nothing is printed and warnings are only formatted if written
+    to a report with write_jsonl()
+
+    >>> sink = WarningSink()
+    >>> sink.quiet = True
+    >>> element = etree.fromstring("<Item />")
+    >>> for _ in range(3):
+    ...     sink.add("oops", dict(element=element, path="items.xml"))
+    >>> sink.add("oops", dict(value=1))
+    >>> str(sink), sink.counts()
+    ('2 warnings » 2 repeats', Counter({'oops': 4}))
+    >>> record = next(iter(sink.records.values()))
+    >>> record.kwargs["element"] is element
+    True
+    >>> record.print(file=StringIO())
+    >>> record.kwargs["element"] is element
+    False
+    >>> sink.merge(sink.to_json())
+    >>> str(sink), sink.counts()
+    ('2 warnings » 6 repeats', Counter({'oops': 8}))
+    """
+
+    def __init__(self):
+        self.quiet = False
+        self.records: dict[tuple, WarningRecord] = {}
+        self.repeats = 0
+
+    def add(self, message, kwargs: dict[str, Any]):
+        path = kwargs.get("path", kwargs.get("file"))
+        line = next(
+            (
+                v.sourceline
+                for v in kwargs.values()
+                if isinstance(v, (etree._Element, VariantElement))
+            ),
+            None,
+        )
+
+        key = _warning_key(message, path, line, kwargs)
+
+        if (record := self.records.get(key)) is not None:
+            record.count += 1
+            self.repeats += 1
+            return
+
+        record = self.records[key] = WarningRecord(message, kwargs, path, line)
+
+        if not self.quiet:
+            record.print()
+
+    def merge(self, records: list[dict]):
+        """
+        add warnings from to_json(), as sent from a worker process; ones about
+        a place already warned about are counted
+        """
+        for json_record in records:
+            message, path, line = (json_record[k] for k in ("message", "path", "line"))
+            values = json_record["values"]
+            count = json_record["count"]
+
+            key = tuple(json_record["key"])
+
+            if (record := self.records.get(key)) is not None:
+                record.count += count
+                self.repeats += count
+                continue
+
+            kwargs = values if path is None else {**values, "path": path}
+            record = self.records[key] = WarningRecord(
+                message, kwargs, path, line, count
+            )
+            self.repeats += count - 1
+
+            if not self.quiet:
+                record.print()
+
+    def clear(self):
+        self.records.clear()
+        self.repeats = 0
+
+    def counts(self) -> Counter:
+        """number of times each message was logged"""
+        counts: Counter = Counter()
+        for record in self.records.values():
+            counts[str(record.message)] += record.count
+        return counts
+
+    def to_json(self) -> list[dict]:
+        """records with their keys, for sending to merge() in another process"""
+        return [
+            {**record.to_json(), "key": key} for key, record in self.records.items()
+        ]
+
+    def write_jsonl(self, path: Path):
+        with path.open("w") as file:
+            for record in self.records.values():
+                file.write(json.dumps(record.to_json()))
+                file.write("\n")
+
+    def __len__(self):
+        return len(self.records)
+
+    def __str__(self):
+        return f"{len(self.records)} warnings » {self.repeats} repeats"
+
+
+def _warning_key(message, path, line: int | None, kwargs: dict[str, Any]) -> tuple:
+    """
+    tells warnings apart by message and place, or by the values they're about
+    if the place isn't known; made of strings and numbers so it's the same
+    after being sent as json
+
+    >>> element = etree.fromstring('<Item identifier="cat" />')
+    >>> _warning_key("oops", None, None, dict(element=element, value=1))
+    ('oops', None, None, 'element', '<Item cat> None:1', 'value', '1')
+    """
+    path = None if path is None else str(path)
+    if path is not None and line is not None:
+        return (str(message), path, line)
+    values = sorted(
+        (key, _warning_value_key(value))
+        for key, value in kwargs.items()
+        if key not in ("path", "file")
+    )
+    return (str(message), path, line, *chain.from_iterable(values))
+
+
+def _warning_value_key(value) -> str:
+    """elements are told apart by where they're from instead of formatting them"""
+    if isinstance(value, (etree._Element, VariantElement)):
+        where = f"{getattr(value, 'base', None)}:{value.sourceline}"
+        if (identifier := value.get("identifier")) is not None:
+            return f"<{value.tag} {identifier}> {where}"
+        return f"<{value.tag}> {where}"
+
+    return format_log_value(value)
+
+
+def _detached_warning_value(value):
+    """a copy of an element on its own, or how a dataclass is printed"""
+    if isinstance(value, VariantElement):
+        value = value.to_element()
+
+    if isinstance(value, etree._Element):
+        return deepcopy(value)
+
+    elif is_dataclass(value):
+        return repr(value)
+
+    else:
+        return value
+
+
+def _warning_values(kwargs: dict[str, Any], path) -> dict[str, str]:
+    return {
+        key: format_log_value(value, path=None if path is None else str(path))
+        for key, value in kwargs.items()
+        if key not in ("path", "file")
+    }
+
+
+_WARNINGS = WarningSink()
 
 
 def format_log_value(v, path=None):
+    if isinstance(v, VariantElement):
+        v = v.to_element()
+
     if isinstance(v, etree._Element):
         # etree.tostringlist does nothing interesting?
         lines = etree.tostring(v).decode().strip().splitlines(keepends=True)
@@ -278,19 +670,45 @@ def coerce_to_identifier(value: str) -> str:
     return "".join(IDENTIFIER_PATTERN.findall(value.strip().lower()))
 
 
+# {value: identifier} for every value passed to make_identifier() and every
+# identifier it made; so an identifier is one string shared by everything
+# referring to it, and each spelling is only normalized once; build() clears it
+# when it starts over so --watch doesn't keep identifiers nothing uses anymore
+_IDENTIFIERS: dict[str, Identifier] = {}
+
+
 def make_identifier(value: str) -> Identifier:
     """
     >>> make_identifier("guitar-ceta")
     'guitar-ceta'
+    >>> make_identifier(" Guitar-Ceta") is make_identifier("guitar-ceta")
+    True
     """
+    if (identifier := _IDENTIFIERS.get(value)) is not None:
+        return identifier
+
     # the game seems to use a lot of case insensitive stuff in Identifier.cs so
     # lowercase these to normalize values
-    value = value.strip().lower()
+    normalized = value.strip().lower()
+
+    if IDENTIFIER_PATTERN.fullmatch(normalized) is None:
+        raise ValueError(normalized)
+
+    identifier = _IDENTIFIERS.setdefault(normalized, Identifier(normalized))
+    _IDENTIFIERS[value] = identifier
+    return identifier
+
+
+NO_CONDITION: tuple[None, None] = (None, None)
 
-    if IDENTIFIER_PATTERN.fullmatch(value) is None:
-        raise ValueError(value)
 
-    return Identifier(value)
+def make_condition(
+    low: float | None, high: float | None
+) -> tuple[float | None, float | None]:
+    """shares one tuple for parts with no condition, which is most of them"""
+    if low is None and high is None:
+        return NO_CONDITION
+    return (low, high)
 
 
 def split_identifier_list(value: str) -> list[Identifier]:
@@ -316,22 +734,201 @@ def xmlbool(value: str) -> bool:
         raise ValueError(value)
 
 
+class Schema(object):
+    """
+    attributes some kind of element is extracted from, declared once and
+    compiled into read(), which returns their values in the order declared
+
+    fields are (name,), (name, convert), or (name, convert, default); names are
+    lowercase and match case insensitively. like Attribs, a missing attribute
+    without a default raises MissingAttribute and convert raising ValueError
+    raises BadValue
+
+    unlike Attribs, every field is read every time; an attribute that is only
+    used sometimes is declared with no convert and a default of None, then
+    converted where it's used with convert_attribute()
+
+    >>> schema = Schema(
+    ...     ("amount", int, 1), ("identifier", make_identifier), ignore=("commonness",)
+    ... )
+    >>> schema.read(etree.fromstring('<Item Identifier=" Foo " commonness="2" />'))
+    (1, 'foo')
+    >>> try:
+    ...     schema.read(etree.fromstring('<Item amount="two" />'))
+    ... except BadValue as err:
+    ...     err.args[0]["attribute"]
+    'amount'
+    >>> element = etree.fromstring('<Item Quality="1" commonness="2" />')
+    >>> [w.kwargs["attributes"] for w in schema.warnings(element)]
+    [('quality',)]
+    """
+
+    def __init__(self, *fields: tuple, ignore: tuple[str, ...] = ()):
+        self.names = tuple(name for name, *_ in fields)
+        self.known = frozenset(self.names + ignore)
+        self.read = _compile_schema_read(fields)
+
+    def warnings(self, element, unused: tuple[str, ...] = ()) -> Iterator[Warning]:
+        """
+        like Attribs.warnings() for unused attributes; those not declared or
+        ignored, and declared attributes in `unused` that weren't used after all
+        """
+        if not _CHECK_UNUSED_ATTRIBUTES:
+            return
+
+        names = dict.fromkeys(map(str.lower, element.keys()))
+
+        if not unused and self.known.issuperset(names):
+            return
+
+        attributes = tuple(
+            name for name in names if name not in self.known or name in unused
+        )
+
+        if attributes:
+            yield Warning(
+                "attributes on element were not used",
+                attributes=attributes,
+                element=element,
+            )
+
+
+def _compile_schema_read(fields: tuple) -> Callable:
+    namespace: dict[str, Any] = {
+        "MissingAttribute": MissingAttribute,
+        "BadValue": BadValue,
+        "absent": object(),
+    }
+    lines = [
+        "def read(element):",
+        "    attrs = {k.lower(): v for k, v in element.items()}",
+    ]
+
+    for i, (name, *rest) in enumerate(fields):
+        convert = rest[0] if rest else None
+        lines.append(f"    v{i} = attrs.get({name!r}, absent)")
+        lines.append(f"    if v{i} is absent:")
+
+        if len(rest) > 1:
+            namespace[f"default{i}"] = rest[1]
+            lines.append(f"        v{i} = default{i}")
+        else:
+            lines.append(
+                f"        raise MissingAttribute(attribute={name!r}, element=element)"
+            )
+
+        if convert is not None:
+            namespace[f"convert{i}"] = convert
+            lines.append("    else:")
+            lines.append("        try:")
+            lines.append(f"            v{i} = convert{i}(v{i})")
+            lines.append("        except ValueError as err:")
+            lines.append(
+                f"            raise BadValue("
+                f"error=err, attribute={name!r}, element=element) from err"
+            )
+
+    lines.append(f"    return ({''.join(f'v{i}, ' for i in range(len(fields)))})")
+
+    exec("\n".join(lines), namespace)
+    return namespace["read"]
+
+
+def convert_attribute(element, attribute: str, value: str, convert: Callable):
+    """convert() for a Schema field that is used only sometimes"""
+    try:
+        return convert(value)
+    except ValueError as err:
+        raise BadValue(error=err, attribute=attribute, element=element) from err
+
+
 def serialize_dataclass(value):
-    if is_dataclass(value):
-        return dataclass_to_dict_without_defaults(value)
+    if (encode := _DATACLASS_ENCODERS.get(type(value))) is not None:
+        return encode(value)
+    elif is_dataclass(value):
+        encode = _DATACLASS_ENCODERS[type(value)] = _compile_dataclass_encoder(
+            type(value)
+        )
+        return encode(value)
     else:
         raise TypeError(value)
 
 
-def dataclass_to_dict_without_defaults(value):
-    return {
-        field.name: getattr(value, field.name)
-        for field in fields(value)
-        if field.default != getattr(value, field.name)
-    }
+# {dataclass: function returning its fields that aren't the default as a dict}
+_DATACLASS_ENCODERS: dict[type, Callable[[Any], dict]] = {}
 
 
-@dataclass
+def _compile_dataclass_encoder(cls: type) -> Callable[[Any], dict]:
+    """
+    >>> @dataclass
+    ... class Foo(object):
+    ...     a: int
+    ...     b: tuple = (None, None)
+    >>> _compile_dataclass_encoder(Foo)(Foo(1))
+    {'a': 1}
+    >>> _compile_dataclass_encoder(Foo)(Foo(1, (2, 3)))
+    {'a': 1, 'b': (2, 3)}
+    """
+    namespace: dict[str, Any] = {}
+    lines = ["def encode(value):", "    d = {}"]
+
+    for f in fields(cls):
+        if f.default is MISSING:
+            lines.append(f"    d[{f.name!r}] = value.{f.name}")
+        else:
+            namespace[f"default_{f.name}"] = f.default
+            lines.append(f"    if default_{f.name} != (v := value.{f.name}):")
+            lines.append(f"        d[{f.name!r}] = v")
+
+    lines.append("    return d")
+
+    exec("\n".join(lines), namespace)
+    return namespace["encode"]
+
+
+# json.dump() always encodes in python, encode() uses the c encoder; so dump
+# encodes parts at a time
+_JSON = json.JSONEncoder(default=serialize_dataclass, separators=(",", ":"))
+
+JSON_CHUNK = 1024
+
+
+def dump_json(value, file, depth=2):
+    """
+    like json.dump(value, file, default=serialize_dataclass, separators=...)
+    but faster; dicts and lists less than `depth` deep are written in pieces
+
+    >>> file = StringIO()
+    >>> dump_json({"a": [1, 2, {"b": None}], "c": {"d": [], "é": 0.5}}, file)
+    >>> file.getvalue() == json.dumps(
+    ...     {"a": [1, 2, {"b": None}], "c": {"d": [], "é": 0.5}},
+    ...     separators=(",", ":"),
+    ... )
+    True
+    """
+    if depth and isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        file.write("{")
+        for i, (key, item) in enumerate(value.items()):
+            if i:
+                file.write(",")
+            file.write(_JSON.encode(key))
+            file.write(":")
+            dump_json(item, file, depth - 1)
+        file.write("}")
+
+    elif depth and isinstance(value, list):
+        file.write("[")
+        for i, chunk in enumerate(chunks(value, JSON_CHUNK)):
+            if i:
+                file.write(",")
+            file.write(_JSON.encode(chunk)[1:-1])
+        file.write("]")
+
+    else:
+        file.write(_JSON.encode(value))
+
+
+@dataclass(slots=True)
 class Part(object):
     """RequiredItem or any item output of Fabricate or money"""
 
@@ -341,7 +938,7 @@ class Part(object):
     # condition (like health or quality) required to be consumed or to be
     # yielded? (CopyCondition and OutCondition{Min,Max} is used to specify
     # condition of outputs/yielded items)
-    condition: tuple[float | None, float | None] = (None, None)
+    condition: tuple[float | None, float | None] = NO_CONDITION
 
     @property
     def is_created(self):
@@ -363,7 +960,7 @@ class Part(object):
         self.amount += other.amount
 
 
-@dataclass
+@dataclass(slots=True)
 class RandomChoices(object):
     """barotrauma seems to do weighted random with replacement ..."""
 
@@ -371,7 +968,7 @@ class RandomChoices(object):
     amount: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Process(object):
     """Fabricate / Deconstruct / Price"""
 
@@ -393,7 +990,7 @@ class Process(object):
                 yield uses
 
 
-@dataclass
+@dataclass(slots=True)
 class Sprite(object):
     element: etree._Element
     package_name: str
@@ -404,7 +1001,7 @@ class Sprite(object):
     ltwh: tuple[int, int, int, int]
 
 
-@dataclass
+@dataclass(slots=True)
 class BaroItem(object):
     element: etree._Element
     identifier: Identifier
@@ -434,28 +1031,51 @@ def extract_Sprite_under(el):
             yield from extract_Sprite(child)
 
 
-def extract_Sprite(el) -> Iterator[Sprite | Warning]:
-    attrs = Attribs.from_element(el)
+SPRITE_SCHEMA = Schema(
+    ("sheetindex", split_int_pair, None),
+    ("sheetelementsize", None, None),
+    ("sourcerect", None, None),
+    ("source", None, None),
+    ("texture",),
+    (PACKAGE_ORIGIN_KEY,),
+    (PACKAGE_RELATIVE_KEY,),
+)
 
+
+def extract_Sprite(el) -> Iterator[Sprite | Warning]:
     try:
-        # fmt: off
-        if     (sheetindex := attrs.or_none("sheetindex", convert=split_int_pair)) \
-           and (sheetelementsize := attrs.or_none("sheetelementsize", convert=split_int_pair)):
+        (
+            sheetindex,
+            sheetelementsize,
+            sourcerect,
+            source,
+            texture,
+            package_name,
+            package_relative_path,
+        ) = SPRITE_SCHEMA.read(el)
+
+        if sheetindex and sheetelementsize is not None:
             (col, row) = sheetindex
-            (w, h) = sheetelementsize
+            (w, h) = convert_attribute(
+                el, "sheetelementsize", sheetelementsize, split_int_pair
+            )
             ltwh = (w * col, row * h, w, h)
 
+        elif sourcerect is not None:
+            ltwh = convert_attribute(el, "sourcerect", sourcerect, split_ltwh)
+
+        elif source is not None:
+            ltwh = convert_attribute(el, "source", source, split_ltwh)
+
         else:
-            ltwh = attrs.or_none("sourcerect", convert=split_ltwh) \
-                or attrs.use("source", convert=split_ltwh)
-        # fmt: on
+            raise MissingAttribute(attribute="source", element=el)
 
         yield Sprite(
             element=el,
-            texture=attrs.use("texture"),
+            texture=texture,
             ltwh=ltwh,
-            package_name=attrs.use(PACKAGE_ORIGIN_KEY),
-            package_relative_path=attrs.use(PACKAGE_RELATIVE_KEY),
+            package_name=package_name,
+            package_relative_path=package_relative_path,
         )
     except Error as err:
         yield err.as_warning()
@@ -480,15 +1100,15 @@ def extract_Item(item) -> Iterator[Process | Warning]:
         try:
             if tag == "fabricate":
                 id = make_process_id(identifier, tag, next(counts[tag]))
-                yield from extract_Fabricate(el, id=id)
+                yield from extract_Fabricate(el, identifier, id=id)
 
             elif tag == "deconstruct":
                 id = make_process_id(identifier, tag, next(counts[tag]))
-                yield from extract_Deconstruct(el, id=id)
+                yield from extract_Deconstruct(el, identifier, id=id)
 
             elif tag == "price":
                 id = make_process_id(identifier, tag, next(counts[tag]))
-                yield from extract_Price(el, id=id)
+                yield from extract_Price(el, identifier, id=id)
 
         except Error as err:
             yield err.as_warning()
@@ -503,43 +1123,56 @@ def extract_item_identifier(el) -> Identifier:
     return make_identifier(identifier)
 
 
-def extract_Fabricate(el, **kwargs) -> Iterator[Process | Warning]:
-    # <Fabricate> is a child of <Item> or whatever. Our model is upside down
-    # compared to Barotrauma. Our Fabricate has the item it outs output as a
-    # child in `uses`.
-
-    attrs = Attribs.from_element(el)
-    attrs.ignore(
+FABRICATE_SCHEMA = Schema(
+    ("amount", int, 1),
+    ("suitablefabricators", split_identifier_list),
+    ("requiredtime", float, 1.0),
+    ("requiresrecipe", xmlbool, False),
+    ("displayname", None, None),
+    ("requiredmoney", int, None),
+    ignore=(
         "fabricationlimitmin",
         "fabricationlimitmax",
         "quality",
         "outcondition",
         "hidefornontraitors",
         "movetoslot",
-    )
+    ),
+)
+
+
+def extract_Fabricate(
+    el, item_identifier: Identifier, **kwargs
+) -> Iterator[Process | Warning]:
+    # <Fabricate> is a child of <Item> or whatever. Our model is upside down
+    # compared to Barotrauma. Our Fabricate has the item it outs output as a
+    # child in `uses`.
+
+    (
+        amount,
+        stations,
+        time,
+        needs_recipe,
+        description,
+        requiredmoney,
+    ) = FABRICATE_SCHEMA.read(el)
 
     res = Process(
         **kwargs,
-        uses=[
-            Part(
-                what=extract_item_identifier(el.getparent()),
-                amount=attrs.use("amount", convert=int, default=1),
-            )
-        ],
+        uses=[Part(what=item_identifier, amount=amount)],
         skills={},
-        stations=attrs.use("suitablefabricators", convert=split_identifier_list),
-        time=attrs.use("requiredtime", convert=float, default=1.0),
-        needs_recipe=attrs.use("requiresrecipe", default=False, convert=xmlbool),
-        description=attrs.opt("displayname"),
+        stations=stations,
+        time=time,
+        needs_recipe=needs_recipe,
+        description=description,
     )
 
-    requiredmoney = attrs.opt("requiredmoney", convert=int)
     if requiredmoney:  # probably buying from a vending machine
         res.uses.append(Part(what=MONEY, amount=-requiredmoney))
 
-    yield from attrs.warnings()
+    yield from FABRICATE_SCHEMA.warnings(el)
 
-    for child in el.xpath("*"):
+    for child in skip_comments(el):
         try:
             for item in extract_Fabricate_Item(child):
                 if isinstance(item, Part):
@@ -556,63 +1189,87 @@ def extract_Fabricate(el, **kwargs) -> Iterator[Process | Warning]:
     yield res
 
 
+REQUIRED_SKILL_SCHEMA = Schema(("identifier", make_identifier), ("level", float))
+
+REQUIRED_ITEM_SCHEMA = Schema(
+    ("identifier", make_identifier, None),
+    ("tag", None, None),
+    ("amount", int, None),
+    ("count", None, None),
+    ("mincondition", float, None),
+    ("maxcondition", float, None),
+    ignore=("usecondition", "header", "defaultitem"),
+)
+
+
 def extract_Fabricate_Item(el) -> Iterator[RequiredSkill | Part | Warning]:
-    attrs = Attribs.from_element(el)
+    tag = el.tag.lower()
 
-    if el.tag.lower() == "requiredskill":
-        skill_identifier = attrs.use("identifier", convert=make_identifier)
-        skill_level = attrs.use("level", convert=float)
+    if tag == "requiredskill":
+        skill_identifier, skill_level = REQUIRED_SKILL_SCHEMA.read(el)
         yield {skill_identifier: skill_level}
 
-    elif el.tag.lower() in ("requireditem", "item"):
-        attrs.ignore("usecondition", "header", "defaultitem")
-
-        what = attrs.or_none("identifier", convert=make_identifier)
-        if what is None:
-            what = attrs.or_none("tag", convert=make_identifier)
+    elif tag in ("requireditem", "item"):
+        (
+            what,
+            what_tag,
+            amount,
+            count,
+            mincondition,
+            maxcondition,
+        ) = REQUIRED_ITEM_SCHEMA.read(el)
+
+        if what is None and what_tag is not None:
+            what = convert_attribute(el, "tag", what_tag, make_identifier)
         if what is None:
             raise MissingAttribute(attribute=("identifier", "tag"), element=el)
 
-        # this is an ingredient/required item. it is consumed
-        # during fabrication, so the amount is negative
-        amount = -(
-            attrs.or_none("amount", convert=int)
-            or attrs.use("count", convert=int, default=1)
-        )
+        if not amount:
+            amount = 1 if count is None else convert_attribute(el, "count", count, int)
 
         yield Part(
             what=what,
-            amount=amount,
-            condition=(
-                attrs.or_none("mincondition", convert=float),
-                attrs.or_none("maxcondition", convert=float),
-            ),
+            # this is an ingredient/required item. it is consumed
+            # during fabrication, so the amount is negative
+            amount=-amount,
+            condition=make_condition(mincondition, maxcondition),
             # description=attrs.or_none("description"),
         )
 
     else:
         yield warn_unexpected_element(unexpected=el)
 
-    for child in el.xpath("*"):
+    for child in skip_comments(el):
         yield warn_unexpected_element(unexpected=child)
 
 
-def extract_Deconstruct(el, **kwargs) -> Iterator[Process | Warning]:
-    attrs = Attribs.from_element(el)
+DECONSTRUCT_SCHEMA = Schema(
+    ("time", float, 1.0),
+    ("requireddeconstructor", split_identifier_list, None),
+    ("chooserandom", xmlbool, False),
+    # only with chooserandom
+    ("amount", None, None),
+)
+
+
+def extract_Deconstruct(
+    el, item_identifier: Identifier, **kwargs
+) -> Iterator[Process | Warning]:
+    time, stations, chooserandom, amount = DECONSTRUCT_SCHEMA.read(el)
 
     fab = Process(
         **kwargs,
-        uses=[Part(what=extract_item_identifier(el.getparent()), amount=-1)],
+        uses=[Part(what=item_identifier, amount=-1)],
         skills={},
-        time=attrs.use("time", convert=float, default=1.0),
-        stations=attrs.use(
-            "requireddeconstructor",
-            default=[make_identifier("deconstructor")],
-            convert=split_identifier_list,
-        ),
+        time=time,
+        stations=[make_identifier("deconstructor")] if stations is None else stations,
     )
 
-    if attrs.use("chooserandom", convert=xmlbool, default=False):
+    # set if requiredotheritem is moved up out of the children, they're not
+    # modified since the same element is extracted for every load order
+    hoisted = False
+
+    if chooserandom:
         # Weird special case for genetics detailed in extract_Deconstruct_Item() ...
         #
         # I don't want to model identifying unidentified genetic material the
@@ -621,7 +1278,7 @@ def extract_Deconstruct(el, **kwargs) -> Iterator[Process | Warning]:
         #
         # So this peeks if all children under chooserandom have the same
         # requiredotheritem and "moves" it up in that case.
-        children = iter(el.xpath("*"))
+        children = iter(skip_comments(el))
         if (
             (head := next(children, None)) is not None
             and (req := head.get("requiredotheritem")) is not None
@@ -633,22 +1290,23 @@ def extract_Deconstruct(el, **kwargs) -> Iterator[Process | Warning]:
             else:
                 raise Exception("did not find requiredotheritem")
 
-            for child in el.xpath("*"):
-                child.attrib.pop("requiredotheritem")
-
             fab.uses.append(item)
+            hoisted = True
+
+        if amount is not None:
+            amount = convert_attribute(el, "amount", amount, int)
 
         choose = RandomChoices(
             weighted_random_with_replacement=[],
-            amount=attrs.use("amount", convert=int, default=1),
+            amount=1 if amount is None else amount,
         )
         fab.uses.append(choose)
     else:
         choose = None
 
-    for child in el.xpath("*"):
+    for child in skip_comments(el):
         try:
-            for item in extract_Deconstruct_Item(child):
+            for item in extract_Deconstruct_Item(child, hoisted=hoisted):
                 if isinstance(item, Part):
                     if item.is_created:
                         if choose is None:
@@ -673,12 +1331,17 @@ def extract_Deconstruct(el, **kwargs) -> Iterator[Process | Warning]:
 
     yield fab
 
-    yield from attrs.warnings()
+    unused = () if chooserandom else ("amount",)
+    yield from DECONSTRUCT_SCHEMA.warnings(el, unused=unused)
 
 
-def extract_Deconstruct_Item(el) -> Iterator[Part | Warning]:
-    attrs = Attribs.from_element(el)
-    attrs.ignore(
+DECONSTRUCT_ITEM_SCHEMA = Schema(
+    ("identifier", make_identifier),
+    ("amount", int, 1),
+    ("mincondition", float, None),
+    ("maxcondition", float, None),
+    ("requiredotheritem", None, None),
+    ignore=(
         "commonness",
         "copycondition",
         # useful but confusing to display vs the condition the input is
@@ -694,22 +1357,30 @@ def extract_Deconstruct_Item(el) -> Iterator[Part | Warning]:
         #     <Deconstruct>
         #       <Item identifier="geneticmaterialhusk" multiplier="5" />
         "multiplier",
-    )
+    ),
+)
 
+
+def extract_Deconstruct_Item(el, hoisted=False) -> Iterator[Part | Warning]:
     if el.tag.lower() in (
         "requireditem",  # not to be confused with requiredotheritem lulz
         "item",
     ):
+        (
+            what,
+            amount,
+            mincondition,
+            maxcondition,
+            other,
+        ) = DECONSTRUCT_ITEM_SCHEMA.read(el)
+
         # Deconstruction Items are yields, so positive amounts
         # mincondition maxcondition constrain whether that item qualifies to be
         # yielded as an output,
         yield Part(
-            what=attrs.use("identifier", convert=make_identifier),
-            amount=attrs.use("amount", convert=int, default=1),
-            condition=(
-                attrs.or_none("mincondition", convert=float),
-                attrs.or_none("maxcondition", convert=float),
-            ),
+            what=what,
+            amount=amount,
+            condition=make_condition(mincondition, maxcondition),
             # description=attrs.or_none("description"),
         )
 
@@ -760,22 +1431,27 @@ def extract_Deconstruct_Item(el) -> Iterator[Part | Warning]:
         # Combining genetics is also a Deconstruct with requiredotheritem. But
         # less fucky since chooserandom is not involved.
 
-        other = attrs.or_none("requiredotheritem")
-        if other is not None:
+        if other is not None and not hoisted:
             yield Part(what=make_identifier(other), amount=-1)
 
+        yield from DECONSTRUCT_ITEM_SCHEMA.warnings(el)
+
     else:
         yield warn_unexpected_element(unexpected=el)
 
-    yield from attrs.warnings()
-
+        # nothing was read from it
+        unused = DECONSTRUCT_ITEM_SCHEMA.names
+        if hoisted:
+            unused = tuple(name for name in unused if name != "requiredotheritem")
+        yield from DECONSTRUCT_ITEM_SCHEMA.warnings(el, unused=unused)
 
-def extract_Price(el, **kwargs) -> Iterator[Process | Warning]:
-    attrs = Attribs.from_element(el)
 
-    # canbespecial is for discounts or in demand i guess? could be interesting
-    # requiresunlock not sure how to display this but would be useful
-    attrs.ignore(
+# canbespecial is for discounts or in demand i guess? could be interesting
+# requiresunlock not sure how to display this but would be useful
+PRICE_SCHEMA = Schema(
+    ("sold", xmlbool, None),
+    ("soldbydefault", None, None),
+    ignore=(
         "minleveldifficulty",
         "minavailable",
         "maxavailable",
@@ -783,63 +1459,80 @@ def extract_Price(el, **kwargs) -> Iterator[Process | Warning]:
         "displaynonempty",
         "requiresunlock",
         "requiredfaction",
-    )
-    # these are probably important if showing/guessing prices
-    attrs.ignore("baseprice", "buyingpricemodifier", "multiplier")
+        # these are probably important if showing/guessing prices
+        "baseprice",
+        "buyingpricemodifier",
+        "multiplier",
+    ),
+)
+
+STORE_PRICE_SCHEMA = Schema(
+    ("locationtype", make_identifier, None),
+    ("storeidentifier", split_identifier_list, None),
+    ("sold", xmlbool, None),
+    ignore=(
+        "multiplier",
+        "minavailable",
+        "maxavailable",
+        "mindifficulty",
+        "minleveldifficulty",
+    ),
+)
+
 
+def extract_Price(
+    el, item_identifier: Identifier, **kwargs
+) -> Iterator[Process | Warning]:
     # price = attrs.use("baseprice", convert=float, default=0.0)
     # multiplier = attrs.use("multiplier", convert=float, default=1.0)
 
-    is_sold_by_stores_generally = attrs.use("sold", convert=xmlbool, default=None)
-    if is_sold_by_stores_generally is None:
-        is_sold_by_stores_generally = attrs.use(
-            "soldbydefault", convert=xmlbool, default=True
+    is_sold_by_stores_generally, soldbydefault = PRICE_SCHEMA.read(el)
+    if is_sold_by_stores_generally is not None:
+        yield from PRICE_SCHEMA.warnings(el, unused=("soldbydefault",))
+    else:
+        is_sold_by_stores_generally = (
+            True
+            if soldbydefault is None
+            else convert_attribute(el, "soldbydefault", soldbydefault, xmlbool)
         )
-
-    yield from attrs.warnings()
+        yield from PRICE_SCHEMA.warnings(el)
 
     price = Process(
         **kwargs,
         stations=[],
         uses=[
             Part(what=MONEY, amount=-1),
-            Part(what=extract_item_identifier(el.getparent()), amount=1),
+            Part(what=item_identifier, amount=1),
         ],
         skills={},
     )
 
-    for child in el.xpath("*"):
+    for child in skip_comments(el):
 
         if child.tag.lower() != "price":
             yield warn_unexpected_element(unexpected=child)
             continue
 
-        attrs = Attribs.from_element(child)
-        attrs.ignore(
-            "multiplier",
-            "minavailable",
-            "maxavailable",
-            "mindifficulty",
-            "minleveldifficulty",
-        )
+        unused: tuple[str, ...] = ()
 
         try:
-            locationtype = attrs.opt("locationtype", convert=make_identifier)
-            if locationtype:
-                stations_fallback = dict(default=[f"merchant{locationtype}"])
-            else:
-                stations_fallback = dict()
-            stations = attrs.use(
-                "storeidentifier", convert=split_identifier_list, **stations_fallback
-            )
+            locationtype, stations, sold = STORE_PRICE_SCHEMA.read(child)
+
+            if stations is None:
+                if not locationtype:
+                    unused = ("sold",)
+                    raise MissingAttribute(attribute="storeidentifier", element=child)
+                stations = [f"merchant{locationtype}"]
 
-            if attrs.use("sold", convert=xmlbool, default=is_sold_by_stores_generally):
+            if sold is None:
+                sold = is_sold_by_stores_generally
+            if sold:
                 price.stations.extend(stations)
 
         except Error as err:
             yield err.as_warning()
 
-        yield from attrs.warnings()
+        yield from STORE_PRICE_SCHEMA.warnings(child, unused=unused)
 
     if price.stations:
         yield price
@@ -866,7 +1559,7 @@ class ContentPackage(object):
     steamworkshopid: str
 
 
-@dataclass
+@dataclass(slots=True)
 class PreItem(object):
     """variant_of not applied"""
 
@@ -938,20 +1631,138 @@ def extract_ContentPath(element, convert_path) -> Iterator[ContentPath | Warning
         yield from a.warnings()
 
 
-def apply_variants(
-    preitems: dict[Identifier, PreItem]
-) -> Iterator[tuple[Identifier, etree._Element] | Warning]:
-    graph: dict[Identifier, set[Identifier]] = {}
+class VariantElement(object):
+    """
+    what apply_variant() makes; looks enough like an lxml element to extract
+    from, its children are lxml elements or more VariantElements
 
-    for identifier, preitem in preitems.items():
+    children that aren't merged with anything are the same elements as in the
+    base or variant, shared instead of copied
+    """
 
-        if preitem.variant_of is None:
-            yield identifier, preitem.element
+    __slots__ = ("tag", "attrib", "sourceline", "children")
 
-        elif preitem.variant_of not in preitems:
-            yield Warning(
-                "element's variant_of not not found",
-                element=preitem.element,
+    def __init__(self, tag: str, attrib: dict[str, str], sourceline, children: list):
+        self.tag = tag
+        self.attrib = attrib
+        self.sourceline = sourceline
+        self.children = children
+
+    def get(self, key: str, default=None):
+        return self.attrib.get(key, default)
+
+    def items(self):
+        return list(self.attrib.items())
+
+    def keys(self):
+        return list(self.attrib.keys())
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def iterchildren(self, tag=None):
+        # children are from skip_comments() so they're always elements, which
+        # is the only tag this is called with
+        return iter(self.children)
+
+    def __len__(self):
+        return len(self.children)
+
+    def to_element(self) -> etree._Element:
+        """copy into an lxml element, for printing"""
+        element = etree.Element(self.tag, self.attrib)
+        element.sourceline = self.sourceline
+        for child in self.children:
+            if isinstance(child, VariantElement):
+                element.append(child.to_element())
+            else:
+                element.append(copy(child))
+        return element
+
+
+class SharedWork(object):
+    """
+    results that don't depend on the load order an item is in, so bundles made
+    in the same run only do them once; mostly this is the vanilla items, which
+    are in every load order
+
+    an applied variant is keyed by the PreItems it's made from, which covers
+    the packages they come from; everything else is keyed by the item element
+    """
+
+    def __init__(self):
+        # {(id(PreItem), ...): ((PreItem, ...), element)}
+        self.applied: dict[tuple[int, ...], tuple[tuple, etree._Element]] = {}
+        # {id(element): (element, [BaroItem, ...])}
+        self.baro_items: dict[int, tuple[etree._Element, list]] = {}
+        # {id(element): (element, [Process, ...])}
+        self.processes: dict[int, tuple[etree._Element, list]] = {}
+        # {(texture path, ltwh, format): thumbnail}
+        self.sprites: dict[tuple[Path, tuple[int, int, int, int], str], bytes] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return f"{self.hits} reused » {self.misses} done"
+
+    def baro_items_of(self, element) -> list["BaroItem"]:
+        if (found := self.baro_items.get(id(element))) is not None:
+            self.hits += 1
+            return found[1]
+
+        self.misses += 1
+        items = list(log_warnings(extract_BaroItem(element)))
+        self.baro_items[id(element)] = (element, items)
+        return items
+
+    def processes_of(self, element, xmlpath: Path) -> list["Process"]:
+        if (found := self.processes.get(id(element))) is not None:
+            self.hits += 1
+            return found[1]
+
+        self.misses += 1
+        processes = list(
+            tidy_processes(log_warnings(extract_Item(element), path=xmlpath))
+        )
+        self.processes[id(element)] = (element, processes)
+        return processes
+
+    def forget(self, preitems: list["PreItem"]):
+        """drop what was done from these, so their elements can be freed"""
+        ids = {id(preitem) for preitem in preitems}
+        elements = [preitem.element for preitem in preitems]
+
+        for key in [key for key in self.applied if not ids.isdisjoint(key)]:
+            _, element = self.applied.pop(key)
+            elements.append(element)
+
+        for element in elements:
+            self.baro_items.pop(id(element), None)
+            self.processes.pop(id(element), None)
+
+    def forget_texture(self, path: Path) -> bool:
+        """drop sprites cut from this texture, true if there were any"""
+        keys = [key for key in self.sprites if key[0] == path]
+        for key in keys:
+            del self.sprites[key]
+        return bool(keys)
+
+
+def apply_variants(
+    preitems: dict[Identifier, PreItem],
+    shared: SharedWork | None = None,
+) -> Iterator[tuple[Identifier, etree._Element | VariantElement] | Warning]:
+    graph: dict[Identifier, set[Identifier]] = {}
+
+    for identifier, preitem in preitems.items():
+
+        if preitem.variant_of is None:
+            yield identifier, preitem.element
+
+        elif preitem.variant_of not in preitems:
+            yield Warning(
+                "element's variant_of not not found",
+                element=preitem.element,
                 variant_of=preitem.variant_of,
                 path=preitem.xmlpath,
             )
@@ -963,18 +1774,43 @@ def apply_variants(
     # _after_ the identifiers of the item they are a variant of ...
     #
     # so B =variant_of=> A yields A before B
-    applied: dict[Identifier, etree._Element] = {}
+    applied: dict[Identifier, VariantElement] = {}
+
+    # {identifier: (PreItem, ...)} the variant and what it's a variant of
+    chains: dict[Identifier, tuple[PreItem, ...]] = {}
 
     for identifier in TopologicalSorter(graph).static_order():
 
         # anything that isn't a variant was already yielded in the earlier loop
         if (variation := preitems[identifier]).variant_of is None:
+            chains[identifier] = (variation,)
             continue
 
-        # fmt: off
-        base_element = applied.get(variation.variant_of) \
-                    or preitems[variation.variant_of].element
-        # fmt: on
+        # already warned about in the earlier loop
+        if variation.variant_of not in preitems:
+            continue
+
+        if (base_chain := chains.get(variation.variant_of)) is None:
+            yield Warning(
+                "element's variant_of is a variant of something not found",
+                element=variation.element,
+                variant_of=variation.variant_of,
+                path=variation.xmlpath,
+            )
+            continue
+
+        chain = chains[identifier] = (variation, *base_chain)
+        key = tuple(map(id, chain))
+
+        if shared is not None and (found := shared.applied.get(key)) is not None:
+            shared.hits += 1
+            applied[identifier] = found[1]
+            yield identifier, found[1]
+            continue
+
+        base_element: etree._Element | VariantElement
+        if (base_element := applied.get(variation.variant_of)) is None:
+            base_element = preitems[variation.variant_of].element
 
         applied_element = applied[identifier] = apply_variant(
             base_element,
@@ -982,12 +1818,19 @@ def apply_variants(
             only_tags=("fabricate", "deconstruct", "price", "inventoryicon", "sprite"),
         )
 
+        if shared is not None:
+            shared.misses += 1
+            # holds on to the PreItems so their ids aren't reused
+            shared.applied[key] = (chain, applied_element)
+
         yield identifier, applied_element
 
 
 def apply_variant(
-    base: etree._Element, variant: etree._Element, only_tags=()
-) -> etree._Element:
+    base: etree._Element | VariantElement,
+    variant: etree._Element | VariantElement,
+    only_tags=(),
+) -> VariantElement:
     """Given <variant variantof=base>, apply variant over top of base, returning a new element.
 
     variantof is some sort of "inheritance" or reuse gimick where some element
@@ -1010,21 +1853,23 @@ def apply_variant(
     - encounering the <Clear/> element in the variant removes all children
 
     see BarotraumaShared/SharedSource/PreItems/IImplementsVariants.cs
+
+    nothing is copied; children only in the base or only in the variant are
+    shared with them, so don't modify what this returns
     """
-    applied = etree.Element(variant.tag)
-    applied.sourceline = variant.sourceline  # kind of a lie ?
-    # mypy upset that we're passing a generator???
-    applied.attrib.update((k.lower(), v) for k, v in base.attrib.iteritems())  # type: ignore
-    applied.attrib.update((k.lower(), v) for k, v in variant.attrib.iteritems())  # type: ignore
-    # lxml typings need to calm down
-    applied.attrib.pop("variantof", None)  # type: ignore
-    applied.attrib.pop("inherit", None)  # type: ignore
+    attrib = {k.lower(): v for k, v in base.items()}
+    attrib.update((k.lower(), v) for k, v in variant.items())
+    attrib.pop("variantof", None)
+    attrib.pop("inherit", None)
+
+    # kind of a lie ?
+    applied = VariantElement(variant.tag, attrib, variant.sourceline, [])
 
-    variant_children: list[etree._Element | None] = list(skip_comments(variant))
+    variant_children: list = list(skip_comments(variant))
 
     # seems to be a funny special case where <Clear/> is used to produce an
     # element with no children from either the base or the variant
-    if any(c.tag.lower() == "clear" for c in variant_children):  # type: ignore
+    if any(c.tag.lower() == "clear" for c in variant_children):
         return applied
 
     for base_child in skip_comments(base):
@@ -1044,14 +1889,14 @@ def apply_variant(
                 # omits the element in the output instead of merging the
                 # element pair
                 if element_is_non_empty(variant_child):
-                    applied.append(apply_variant(base_child, variant_child))
+                    applied.children.append(apply_variant(base_child, variant_child))
 
                 break
 
         else:
-            applied.append(copy(base_child))
+            applied.children.append(base_child)
 
-    applied.extend(c for c in variant_children if c is not None)
+    applied.children.extend(c for c in variant_children if c is not None)
 
     return applied
 
@@ -1109,7 +1954,7 @@ class Attribs(dict):
 
     @classmethod
     def from_element(cls, element) -> "Attribs":
-        self = cls(((k.lower(), v) for k, v in element.attrib.iteritems()))
+        self = cls(((k.lower(), v) for k, v in element.items()))
         self.__element = element
         self.__missing = []
         return self
@@ -1168,7 +2013,7 @@ class Attribs(dict):
     or_none = opt
 
     def warnings(self) -> Iterator[Warning]:
-        if self:
+        if self and _CHECK_UNUSED_ATTRIBUTES:
             yield Warning(
                 "attributes on element were not used",
                 attributes=tuple(self.keys()),
@@ -1196,6 +2041,14 @@ def sign(i: int):
     return 1 if i >= 0 else -1
 
 
+def chunks(l: list[T], n: int) -> Iterator[list[T]]:
+    """
+    >>> list(chunks([1, 2, 3, 4, 5], 2))
+    [[1, 2], [3, 4], [5]]
+    """
+    return (l[i : i + n] for i in range(0, len(l), n))
+
+
 def partition(it, fn):
     l, r = [], []
     for i in it:
@@ -1203,12 +2056,13 @@ def partition(it, fn):
     return l, r
 
 
-def skip_comments(el: etree._Element) -> Iterator[etree._Element]:
-    return (child for child in el if child.tag is not etree.Comment)
+def skip_comments(el: "etree._Element | VariantElement") -> Iterator:
+    """child elements; not comments or processing instructions, like xpath("*")"""
+    return el.iterchildren(etree.Element)
 
 
-def element_is_non_empty(el: etree._Element) -> bool:
-    return bool(el.attrib or len(el))
+def element_is_non_empty(el: etree._Element | VariantElement) -> bool:
+    return bool(len(el.attrib) or len(el))
 
 
 def resolve_path_with_relative_fallback(
@@ -1216,7 +2070,7 @@ def resolve_path_with_relative_fallback(
     *,
     vanilla: ContentPackage,
     current: ContentPackage,
-    packages: list[ContentPackage],
+    packages: dict[str, ContentPackage],
     fallback: Path,
 ) -> Path:
     _resolve = partial(resolve_path, current=current, packages=packages)
@@ -1229,8 +2083,181 @@ def resolve_path_with_relative_fallback(
         return _resolve(qualified / path, vanilla=None)
 
 
-# {(package path, suffix): {lowercase path: filesystem path}}
-__PATH_CACHE: dict[tuple[Path, str], dict[str, Path]] = {}
+def by_workshop_id(packages: Iterable[ContentPackage]) -> dict[str, ContentPackage]:
+    """for resolve_path, the first package with an id wins"""
+    found: dict[str, ContentPackage] = {}
+    for package in packages:
+        if package.steamworkshopid:
+            found.setdefault(package.steamworkshopid, package)
+    return found
+
+
+class PathIndex(object):
+    """
+    every file under a package directory by its lowercase relative path, from
+    one walk of the directory
+
+    with a directory, indexes are kept on disk between runs and reused if none
+    of the walked directories' modification times have changed; adding,
+    removing, or renaming a file changes the modification time of the
+    directory it is in
+    """
+
+    VERSION = 2
+
+    def __init__(self, directory: Path | None = None):
+        self.directory = directory
+        # {root: {lowercase relative path: relative path}}
+        self.indexes: dict[Path, dict[str, str]] = {}
+        # {root: {directory: mtime_ns}}
+        self.mtimes: dict[Path, dict[str, int]] = {}
+        # {root: [relative path, ...]} xml files that are content packages
+        self.manifests: dict[Path, list[str]] = {}
+        # {root: {lowercase relative path: path}} found by find() already
+        self.found: dict[Path, dict[str, Path]] = {}
+        self.walks = 0
+        self.reused = 0
+        self.lookups = 0
+
+    def __str__(self):
+        return f"{self.walks} walks » {self.reused} reused » {self.lookups} lookups"
+
+    def find(self, root: Path, content_path: str) -> Path | None:
+        """content_path must be lowercase, with / separators"""
+        self.lookups += 1
+
+        found = self.found.setdefault(root, {})
+        if (path := found.get(content_path)) is not None:
+            return path
+
+        if (relative := self._index(root).get(content_path)) is None:
+            return None
+
+        path = found[content_path] = root / relative
+
+        assert path.resolve().is_relative_to(root.resolve())
+
+        return path
+
+    def forget(self, root: Path):
+        """walk root again, or check its saved index, the next time it's used"""
+        self.indexes.pop(root, None)
+        self.mtimes.pop(root, None)
+        self.manifests.pop(root, None)
+        self.found.pop(root, None)
+
+    def package_xmls(
+        self, root: Path, is_package: Callable[[Path], bool]
+    ) -> list[Path]:
+        """
+        xml files under root that is_package() is true for; remembered with
+        the index so every xml file is only opened again once something under
+        root changes
+        """
+        index = self._index(root)
+
+        if (found := self.manifests.get(root)) is None:
+            found = self.manifests[root] = sorted(
+                relative
+                for lower, relative in index.items()
+                if lower.endswith(".xml") and is_package(root / relative)
+            )
+            self._save(root)
+
+        return [root / relative for relative in found]
+
+    def _index(self, root: Path) -> dict[str, str]:
+        if (index := self.indexes.get(root)) is None:
+            index = self._load_or_walk(root)
+        return index
+
+    def _entry_path(self, root: Path) -> Path:
+        assert self.directory is not None
+        digest = sha1(str(root.absolute()).encode()).hexdigest()
+        return self.directory / f"{digest}.pickle"
+
+    def _load_or_walk(self, root: Path) -> dict[str, str]:
+        if self.directory is not None:
+            try:
+                with self._entry_path(root).open("rb") as file:
+                    version, mtimes, index, manifest = pickle.load(file)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                pass
+            else:
+                if version == self.VERSION and _mtimes_unchanged(mtimes):
+                    self.reused += 1
+                    self.mtimes[root] = mtimes
+                    if manifest is not None:
+                        self.manifests[root] = manifest
+                    self.indexes[root] = index
+                    return index
+
+        self.walks += 1
+        self.mtimes[root], index = _walk_files(root)
+        self.indexes[root] = index
+        self._save(root)
+
+        return index
+
+    def _save(self, root: Path):
+        if self.directory is None:
+            return
+
+        entry = (
+            self.VERSION,
+            self.mtimes[root],
+            self.indexes[root],
+            self.manifests.get(root),
+        )
+        entry_path = self._entry_path(root)
+        temp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            with temp_path.open("wb") as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_path)
+        except OSError as err:
+            log_warning("failed to write path index", error=err, path=entry_path)
+
+
+def _walk_files(root: Path) -> tuple[dict[str, int], dict[str, str]]:
+    """
+    returns ({directory: mtime_ns}, {lowercase relative path: relative path})
+    for files under root; doesn't follow symlinked directories, like rglob
+    """
+    mtimes: dict[str, int] = {}
+    index: dict[str, str] = {}
+
+    # (directory, its path relative to root with a trailing /)
+    pending = [(str(root), "")]
+
+    while pending:
+        dirpath, relative = pending.pop()
+        try:
+            mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, f"{relative}{entry.name}/"))
+                    elif entry.is_file():
+                        index[f"{relative}{entry.name}".lower()] = (
+                            f"{relative}{entry.name}"
+                        )
+        except OSError as err:
+            log_warning("failed to list directory", error=err, path=dirpath)
+
+    return mtimes, index
+
+
+def _mtimes_unchanged(mtimes: dict[str, int]) -> bool:
+    try:
+        return all(os.stat(d).st_mtime_ns == t for d, t in mtimes.items())
+    except OSError:
+        return False
+
+
+_PATH_INDEX = PathIndex()
 
 
 def resolve_path(
@@ -1238,7 +2265,7 @@ def resolve_path(
     *,
     vanilla: ContentPackage | None,
     current: ContentPackage,
-    packages: list[ContentPackage],
+    packages: dict[str, ContentPackage],
 ) -> Path:
     """
     given a path to a resouce in a content package, find the corresponding file
@@ -1255,9 +2282,9 @@ def resolve_path(
     also, this sort of expects you to pass it Barotrauma's Content directory
     for the Vanilla package, but Vanilla resource paths are prefixed with
     "content/" so those prefixes are dropped in that case
-    """
-    suffix = Path(path).suffix
 
+    packages is by workshop id, for %ModDir:id% paths; see by_workshop_id()
+    """
     # FIXME not cross platform ...
     path = str(path).replace("\\", "/")
 
@@ -1269,13 +2296,10 @@ def resolve_path(
 
         if mod_id is None:
             package_path = current.path
+        elif (package := packages.get(mod_id)) is not None:
+            package_path = package.path
         else:
-            for package in packages:
-                if package.steamworkshopid == mod_id:
-                    package_path = package.path
-                    break
-            else:
-                raise ValueError(f"mod {mod_id} not found")
+            raise ValueError(f"mod {mod_id} not found")
 
         content_path = relative_path.lower()
 
@@ -1290,20 +2314,9 @@ def resolve_path(
             if trimmed := drop_prefix(content_path, "content/"):
                 content_path = trimmed
 
-    paths = __PATH_CACHE.get((package_path, suffix))
-    if paths is None:
-        paths = __PATH_CACHE[(package_path, suffix)] = {
-            str(p.relative_to(package_path)).lower(): p
-            for p in package_path.rglob(f"*{suffix}")
-        }
-
-    if content_path not in paths:
+    if (realpath := _PATH_INDEX.find(package_path, content_path)) is None:
         raise FileNotFoundError(package_path / content_path)
 
-    realpath = paths[content_path]
-
-    assert realpath.resolve().is_relative_to(package_path.resolve())
-
     return realpath
 
 
@@ -1335,274 +2348,1732 @@ def ltwh_to_ltbr(ltwh: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
     return (l, t, l + w, t + h)
 
 
-__SPRITE_CACHE_LOCK = Lock()
-__SPRITE_CACHE_IMAGE_LOCKS: dict[Path, Lock] = {}
-__SPRITE_CACHE: dict[Path, "PIL.Image.Image"] = {}
+THUMBNAIL_SIZE = 48
 
+class TextureCache(object):
+    """
+    decoded texture sheets, shared by threads cropping sprites out of them
 
-def load_sprite_at_path(
-    path: Path, ltwh: tuple[int, int, int, int]
-) -> "PIL.Image.Image":
-    from PIL import Image
+    images are loaded once and only read from after that, so they're cropped
+    without holding a lock or copying the sheet; keeps at most max_bytes of
+    decoded images, dropping the least recently used
 
-    with __SPRITE_CACHE_LOCK:
-        image_lock = __SPRITE_CACHE_IMAGE_LOCKS.get(path)
-        if image_lock is None:
-            image_lock = __SPRITE_CACHE_IMAGE_LOCKS[path] = Lock()
-
-    with image_lock:
-        image = __SPRITE_CACHE.get(path)
-        if image is None:
-            image = __SPRITE_CACHE[path] = Image.open(path)
-        image = image.copy()
-
-    image = image.crop(ltwh_to_ltbr(ltwh))  # crop to sprite in sheet
-    image = image.crop(image.getbbox())  # crop transparency
-    # thumbnail() is in-place and returns None, that's fine because we copied
-    # from the lock above
-    image.thumbnail((48, 48))
-    return image
+    a sheet is decoded again if its file's size or modification time changed,
+    so worker processes of a pool that outlives a rebuild don't use old ones
+    """
 
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.peak = 0
+        self.loads = 0
+        self.evictions = 0
+        self.__lock = Lock()
+        self.__path_locks: dict[Path, Lock] = {}
+        self.__images: OrderedDict[Path, "PIL.Image.Image"] = OrderedDict()
+        # {path: (size, mtime_ns)} of the file each image was decoded from
+        self.__stats: dict[Path, tuple[int, int] | None] = {}
+
+    def get(self, path: Path) -> "PIL.Image.Image":
+        stat = _file_stat(path)
+
+        with self.__lock:
+            if (image := self.__recent(path, stat)) is not None:
+                return image
+            path_lock = self.__path_locks.setdefault(path, Lock())
+
+        # so only one thread decodes a given sheet
+        with path_lock:
+            with self.__lock:
+                if (image := self.__recent(path, stat)) is not None:
+                    return image
+
+            from PIL import Image
+
+            image = Image.open(path)
+            image.load()
+
+            with self.__lock:
+                self.__insert(path, stat, image)
+
+        return image
+
+    def __recent(self, path: Path, stat) -> "PIL.Image.Image | None":
+        image = self.__images.get(path)
+        if image is None or self.__stats.get(path) != stat:
+            return None
+        self.__images.move_to_end(path)
+        return image
+
+    def __insert(self, path: Path, stat, image: "PIL.Image.Image"):
+        if (replaced := self.__images.pop(path, None)) is not None:
+            self.size -= image_bytes(replaced)
+
+        self.loads += 1
+        self.__images[path] = image
+        self.__stats[path] = stat
+        self.size += image_bytes(image)
+        self.peak = max(self.peak, self.size)
+
+        # keeps the sheet just loaded even if it's bigger than max_bytes; or
+        # only that one if over --max-rss
+        max_bytes = self.max_bytes
+        if _MAX_RSS is not None and current_rss() > _MAX_RSS:
+            max_bytes = 0
+
+        while self.size > max_bytes and len(self.__images) > 1:
+            evicted_path, evicted = self.__images.popitem(last=False)
+            del self.__stats[evicted_path]
+            self.size -= image_bytes(evicted)
+            self.evictions += 1
+
+    def forget(self, path: Path):
+        """drop a texture, like if its file has changed"""
+        with self.__lock:
+            self.__stats.pop(path, None)
+            if (image := self.__images.pop(path, None)) is not None:
+                self.size -= image_bytes(image)
+
+    def clear(self):
+        with self.__lock:
+            self.evictions += len(self.__images)
+            self.__images.clear()
+            self.__stats.clear()
+            self.size = 0
 
-def to_base64(image: "PIL.Image.Image", format="webp") -> str:
-    buf = BytesIO()
-    image.save(buf, format=format)
-    return b64encode(buf.getvalue()).decode()
+    def __str__(self):
+        return (
+            f"{self.loads} loaded » {self.peak / (1 << 20):.1f}MiB peak"
+            f" » {self.evictions} evicted"
+        )
 
 
-def load_xmls(paths: list[Path]) -> Iterator[tuple[Path, etree._Document]]:
-    for path in paths:
-        try:
-            with path.open("rb") as file:
-                doc = etree.parse(file)
+def image_bytes(image: "PIL.Image.Image") -> int:
+    return image.width * image.height * len(image.getbands())
 
-        except (OSError, etree.Error) as err:
-            log_warning(err, file=file)
-            continue
 
-        else:
-            yield path, doc
+_TEXTURE_CACHE = TextureCache(max_bytes=1 << 30)
 
 
-def main() -> None:
-    from argparse import ArgumentParser
+def render_sprites_at_path(
+    path: Path, ltwhs: list[tuple[int, int, int, int]], format="webp"
+) -> list[bytes | Exception]:
+    """
+    encoded thumbnails for many sprites in one texture, in the order of ltwhs
 
-    # fmt: off
-    parser = ArgumentParser()
-    parser.add_argument("--content", nargs="*", action="extend", type=Path, help="path to barotrauma Content or workshop directory containing filelist.xml")
-    parser.add_argument("--output", nargs="?", type=Path, help="path to write package css and json files")
-    parser.add_argument("--package", nargs="*", action="append", dest="load_order", help="deprecated alias for --load-order")
-    parser.add_argument("--load-order", nargs="*", action="append", help="list of package names forming a load order")
-    parser.add_argument("--named-load-order", nargs="+", action="append", help="as --load-order but the first item will be used as the file name when writing the fragment")
-    parser.add_argument("--no-index", action="store_const", const="no", dest="index", help="same as --index=no")
-    parser.add_argument("--index", choices=["no", "yes", "files"], default="yes", help="yes, writes index using given load order; files, makes an index including everything from the output directory")
-    # fmt: on
+    the texture is decoded once and its alpha channel is split out once for
+    finding the bounds of every sprite in it; a sprite that fails gets its
+    exception in the result instead of failing the others
+    """
+    sheet = _TEXTURE_CACHE.get(path)
+    alpha = _alpha_channel(sheet)
 
-    # log_warning("", argv=sys.argv)
-    args = parser.parse_args()
-    # log_warning("", args=args)
+    results: list[bytes | Exception] = []
 
-    load_orders: list[list[str]] = []
-    load_order_names: list[str] = []
+    for ltwh in ltwhs:
+        try:
+            image = _sprite_thumbnail(sheet, alpha, ltwh)
+            results.append(encode_image(image, format=format))
+        except Exception as err:
+            results.append(err)
 
-    if args.named_load_order:
-        for name, *order in args.named_load_order:
-            load_orders.append(order)
-            load_order_names.append(name)
+    return results
 
-    if args.load_order:
-        load_orders += args.load_order
 
-    # init_bundles can raise SystemExit
+def _alpha_channel(sheet: "PIL.Image.Image") -> "PIL.Image.Image | None":
+    # getbbox() on these modes only looks at alpha anyway
+    if sheet.mode in ("RGBA", "RGBa", "LA", "La", "PA"):
+        return sheet.getchannel("A")
+    return None
 
-    bundles: list[Bundle] = []
 
-    if load_orders:
-        bundles = init_bundles(list(args.content), load_orders)
+def _sprite_thumbnail(
+    sheet: "PIL.Image.Image",
+    alpha: "PIL.Image.Image | None",
+    ltwh: tuple[int, int, int, int],
+) -> "PIL.Image.Image":
+    box = ltwh_to_ltbr(ltwh)  # sprite in sheet
+
+    # crop transparency; this scans one byte per pixel instead of four
+    bbox = (sheet if alpha is None else alpha).crop(box).getbbox()
+    if bbox is not None:
+        (l, t, _, _) = box
+        box = (l + bbox[0], t + bbox[1], l + bbox[2], t + bbox[3])
+
+    image = sheet.crop(box)
+    # thumbnail() is in-place and returns None, that's fine because crop()
+    # made a new image that is only ours
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return image
 
-    assert len(bundles) == len(load_orders)
 
-    if not args.output:
-        log_warning("no --output path specified, not writing anything!")
-        return
+def encode_image(image: "PIL.Image.Image", format="webp") -> bytes:
+    buf = BytesIO()
+    image.save(buf, format=format)
+    return buf.getvalue()
 
-    index: list[tuple[Path, Path]] = []
 
-    args.output.mkdir(parents=True, exist_ok=True)
+def to_base64(image: "PIL.Image.Image", format="webp") -> str:
+    return b64encode(encode_image(image, format=format)).decode()
 
-    for name, bundle in zip(chain(load_order_names, repeat(None)), bundles):
-        logtime(f"writing {bundle}")
 
-        if name is None:
-            name = mangled_filename(*(f"{p.name}-{p.version}" for p in bundle.load_order))
+class SpriteCache(object):
+    """
+    encoded sprite thumbnails, stored on disk between runs
 
-        bundle_path = (args.output / name).with_suffix(".json")
-        css_path = (args.output / name).with_suffix(".css")
+    entries are keyed by a hash of the texture file's contents, the sprite's
+    rectangle in it, and how the thumbnail was encoded; so the same texture in
+    a different mod or at a different path shares entries
 
-        css_path.open("w").write(bundle.sprites_css.getvalue())
-        logtime(f"wrote {css_path}")
+    using an entry touches its mtime, when the cache grows past max_bytes the
+    least recently used entries are removed in flush()
+    """
 
-        bundle_json = {
-            "name": name,
-            "load_order": bundle.load_order,
-            "entities": bundle.entities,
-            "processes": bundle.processes,
-            "i18n": bundle.i18n,
-        }
-        json.dump(
-            bundle_json,
-            default=serialize_dataclass,
-            separators=(",", ":"),
-            fp=bundle_path.open("w"),
-        )
-        logtime(f"wrote {bundle_path}")
+    VERSION = 1
 
-        index.append((bundle_path, css_path))
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__lock = Lock()
+        # {texture path: (size, mtime, sha256)}
+        self.__digests: dict[str, tuple[int, int, str]] | None = None
 
+    @property
+    def __digests_path(self) -> Path:
+        return self.directory / "textures.pickle"
+
+    def texture_digest(self, path: Path) -> str:
+        stat = path.stat()
+        key = str(path.absolute())
+
+        with self.__lock:
+            if self.__digests is None:
+                try:
+                    with self.__digests_path.open("rb") as file:
+                        self.__digests = pickle.load(file)
+                except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                    self.__digests = {}
+
+            entry = self.__digests.get(key)  # type: ignore
+
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            return entry[2]
+
+        with path.open("rb") as file:
+            digest = file_digest(file, "sha256").hexdigest()
+
+        with self.__lock:
+            assert self.__digests is not None
+            self.__digests[key] = (stat.st_size, stat.st_mtime_ns, digest)
+
+        return digest
+
+    def _entry_path(self, texture_path: Path, ltwh, format: str) -> Path:
+        key = ":".join(
+            map(
+                str,
+                (
+                    self.VERSION,
+                    self.texture_digest(texture_path),
+                    ltwh,
+                    format,
+                    THUMBNAIL_SIZE,
+                ),
+            )
+        )
+        digest = sha1(key.encode()).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.{format}"
 
-    if args.index == 'no':
-        return
-    
-    elif args.index == 'files':
-        for bundle_path in args.output.glob("*.json"):
-            css_path = bundle_path.with_suffix(".css")
-            index.append((bundle_path, css_path))
+    def get(self, texture_path: Path, ltwh, format: str) -> bytes | None:
+        entry_path = self._entry_path(texture_path, ltwh, format)
 
-    index_path = args.output / "index.ts"
+        try:
+            data = entry_path.read_bytes()
+            os.utime(entry_path)
+        except OSError:
+            data = None
+
+        with self.__lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
 
-    with index_path.open("w") as f:
-        print("/* generated by baro-data.py */", file=f)
+        return data
 
-        for i, (bundle_path, css_path) in enumerate(index):
-            print(
-                f'import {{ load_order as load_order{i}, name as name{i}, }} from "./{bundle_path.name}"',
-                file=f,
-            )
-            print(f'import bundle{i} from "./{bundle_path.name}?url"', file=f)
-            print(f'import sprites{i} from "./{css_path.name}?url"', file=f)
+    def put(self, texture_path: Path, ltwh, format: str, data: bytes):
+        entry_path = self._entry_path(texture_path, ltwh, format)
+        temp_path = entry_path.with_suffix(f".{os.getpid()}.{get_ident()}.tmp")
 
-        print("export const BUNDLES: LoadableBundle[] = [", file=f)
-        for i, _ in enumerate(index):
-            pass
-            print(
-                "{ "
-                "name: name%(i)d, "
-                "load_order: load_order%(i)d, "
-                "url: bundle%(i)d, "
-                "sprites: sprites%(i)d, "
-                "}," % {"i": i},
-                file=f,
-            )
-        print("]\n", file=f)
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path.write_bytes(data)
+            os.replace(temp_path, entry_path)
+        except OSError as err:
+            log_warning("failed to write sprite cache", error=err, path=entry_path)
+
+    def flush(self):
+        """save texture hashes and remove entries until under max_bytes"""
+        if self.__digests is not None:
+            temp_path = self.__digests_path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                with temp_path.open("wb") as file:
+                    pickle.dump(self.__digests, file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self.__digests_path)
+            except OSError as err:
+                log_warning("failed to write sprite cache", error=err, path=temp_path)
+
+        entries = []
+        for subdirectory in self.directory.glob("??"):
+            for entry in os.scandir(subdirectory):
+                if not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
 
-        print(TYPES_TS, file=f)
+    def __str__(self):
+        return f"{self.hits} hits » {self.misses} misses » {self.evictions} evicted"
 
-    logtime(f"wrote {len(index)} entries to {index_path}")
 
+@dataclass
+class SpriteOptions(object):
+    # pack sprites into webp sheets instead of a data url per sprite
+    atlas: bool = False
+    cache: SpriteCache | None = None
+    # render on a process pool if more than one, otherwise on threads
+    jobs: int = 0
+    # that process pool, started once by build() and used by every bundle
+    executor: Executor | None = None
 
-def _rglob_for_ContentPackages(paths: list[Path]) -> Iterator[ContentPackage | Warning]:
-    for path in paths:
-        for xmlpath in path.rglob("*.xml"):
-            element = find_ContentPackage_element(xmlpath)
-            if element is not None:
-                for item in extract_ContentPackageHeader(element):
-                    if isinstance(item, Warning):
-                        yield item.with_path(xmlpath)
-                    else:
-                        # FIXME this can bind multiple ContentPackages to the
-                        # same path, which will not work
-                        yield ContentPackage(
-                            path=path, xmlpath=xmlpath, element=element, **asdict(item)
-                        )
 
+@dataclass
+class ItemRecord(object):
+    """ItemHeader without a live element, for storing in a ParseCache"""
 
-def _find_core_package_or_exit(packages: list[ContentPackage]) -> ContentPackage:
-    is_core, non_core = partition(packages, lambda p: p.iscorepackage)
+    identifier: Identifier
+    variant_of: Identifier | None
+    # serialized <Item> element
+    xml: bytes
+    # line of the <Item> element in the file it was read from
+    sourceline: int | None
 
-    if len(is_core) != 1:
-        log_warning(
-            "expected exactly one contentpackage to be marked a corepackage",
-            iscorepackage=set(p.name for p in is_core),
-            notcorepackage=set(p.name for p in non_core),
+    @classmethod
+    def from_header(cls, header: "ItemHeader") -> "ItemRecord":
+        return cls(
+            identifier=header.identifier,
+            variant_of=header.variant_of,
+            xml=etree.tostring(header.element, with_tail=False),
+            sourceline=header.element.sourceline,
         )
-        raise SystemExit(1)
-
-    return is_core[0]
-
 
-def _validate_load_order_or_exit(
-    vanilla: ContentPackage,
-    packages: list[ContentPackage],
-    load_order_list: list[list[str]] | None,
-) -> list[list[ContentPackage]]:
-    if not load_order_list:
-        return [[vanilla]]
+    def to_header(self) -> "ItemHeader":
+        element = etree.fromstring(self.xml)
 
-    package_load_order_list = []
-    package_by_name = {package.name: package for package in packages}
-    package_by_path = {package.path.name: package for package in packages}
-    package_names = set(chain(package_by_name, package_by_path))
+        # line numbers are relative to the serialized element, fix them up so
+        # that warnings point to the right line in the original file
+        if self.sourceline is not None:
+            for el in element.iter():
+                if el.sourceline is not None:
+                    el.sourceline += self.sourceline - 1
 
-    if missing := set(chain.from_iterable(load_order_list)) - package_names:
-        log_warning(
-            "some requested packages were not found under --content",
-            missing=missing,
-            available=package_names,
+        return ItemHeader(
+            element=element, identifier=self.identifier, variant_of=self.variant_of
         )
-        raise SystemExit(1)
 
-    for load_order in load_order_list:
-        package_load_order = [
-            package_by_path.get(name) or package_by_name[name]
-            for name in load_order
-        ]
 
-        if package_load_order and package_load_order[0].iscorepackage:
-            pass
+@dataclass
+class TextRecord(object):
+    """InfoTexts without a package, for storing in a ParseCache"""
 
-        elif any(p.iscorepackage for p in package_load_order):
-            log_warning(
-                "corepackage found in load order but not the first item",
-                shouldbefirst=vanilla,
-            )
-            raise SystemExit(1)
+    language: str
+    dictionary: dict[str, str]
 
-        else:
-            package_load_order = [vanilla] + package_load_order
 
-        package_load_order_list.append(package_load_order)
+class ParseCache(object):
+    """
+    what we read out of item and text xml files, stored on disk between runs
 
-    return package_load_order_list
+    entries are keyed by the file's path, size, and modification time; so
+    editing a file or replacing a workshop download invalidates its entry
+    """
 
+    VERSION = 2
 
-def _resolve_content_package_paths(
-    vanilla: ContentPackage, current: ContentPackage, packages: list[ContentPackage]
-) -> tuple[list[Path], list[Path]]:
-    """returns (items, texts)"""
-    items: list[Path] = []
-    texts: list[Path] = []
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
 
-    convert_path = partial(
-        resolve_path, vanilla=vanilla, current=current, packages=packages
-    )
-    content_paths = extract_ContentPath(current.element, convert_path)
+    def _entry_path(self, path: Path) -> Path:
+        digest = sha1(str(path.absolute()).encode()).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.pickle"
 
-    for content in log_warnings(content_paths, path=current.xmlpath):
-        if content.kind == "item":
-            items.append(content.path)
-        elif content.kind == "text":
-            texts.append(content.path)
-        else:
-            assert False, content.kind
+    def _key(self, kind: str, path: Path) -> tuple:
+        stat = path.stat()
+        path_str = str(path.absolute())
+        return (self.VERSION, kind, path_str, stat.st_size, stat.st_mtime_ns)
 
-    return items, texts
+    def get(self, kind: str, path: Path) -> tuple[tuple, object | None]:
+        """returns (key, records) where records is None on a miss
+
+        the key is for passing to put() after the miss is parsed"""
+        try:
+            key = self._key(kind, path)
+        except OSError:
+            # let whoever parses the file complain about it
+            self.misses += 1
+            return (), None
+
+        try:
+            with self._entry_path(path).open("rb") as file:
+                stored_key, records = pickle.load(file)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            stored_key = records = None
+
+        if stored_key != key:
+            self.misses += 1
+            return key, None
+
+        self.hits += 1
+        return key, records
+
+    def put(self, key: tuple, path: Path, records: object):
+        if not key:
+            return
+
+        entry_path = self._entry_path(path)
+        temp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            with temp_path.open("wb") as file:
+                pickle.dump((key, records), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_path)
+        except OSError as err:
+            log_warning("failed to write parse cache", error=err, path=entry_path)
+
+    def __str__(self):
+        return f"{self.hits} hits » {self.misses} misses"
+
+
+def _read_ItemRecords(path: Path) -> list[ItemRecord] | None:
+    if (headers := load_ItemHeaders(path)) is None:
+        return None
+    return [ItemRecord.from_header(h) for h in headers]
+
+
+class ContentReader(object):
+    """
+    reads item and text xml files, maybe from a ParseCache, maybe in parallel
+
+    with a process pool, files passed to prefetch_*() are parsed by workers
+    that send back ItemRecords and TextRecords; lxml trees can't be pickled.
+    reading files still happens in whatever order the caller asks for them, so
+    results are the same as reading them one at a time
+
+    text files are read with the set of keys wanted from them, or everything
+    if that's None; except when caching, where the whole file is cached and
+    filtered afterwards
+    """
+
+    def __init__(self, cache: ParseCache | None = None, jobs: int = 0):
+        self.cache = cache
+        self.jobs = jobs
+        self.__pending: dict[tuple[str, Path], tuple[tuple, Future]] = {}
+        self.__pool: ProcessPoolExecutor | None = None
+
+    def __enter__(self):
+        if self.jobs > 1:
+            self.__pool = ProcessPoolExecutor(max_workers=self.jobs)
+        return self
+
+    def __exit__(self, *_):
+        if self.__pool is not None:
+            self.__pool.shutdown(cancel_futures=True)
+            self.__pool = None
+        self.__pending.clear()
+
+    def prefetch_items(self, paths: Iterable[Path]):
+        """submit files to the process pool, if there is one, to parse them early"""
+        self.__prefetch("item", paths, _read_ItemRecords)
+
+    def prefetch_texts(self, paths: Iterable[Path], wanted: set[str] | None):
+        """submit files to the process pool, if there is one, to parse them early"""
+        if self.cache is not None:
+            self.__prefetch("text", paths, load_TextRecord)
+        else:
+            self.__prefetch("text", paths, partial(load_TextRecord, wanted=wanted))
+
+    def __prefetch(self, kind: str, paths: Iterable[Path], read: Callable):
+        if self.__pool is None:
+            return
+
+        for path in paths:
+            if (kind, path) in self.__pending:
+                continue
+
+            key, records = self.__cached(kind, path)
+            if records is not None:
+                self.__pending[kind, path] = (), _done_future(records)
+            else:
+                self.__pending[kind, path] = key, self.__pool.submit(read, path)
+
+    def item_headers(self, path: Path) -> list["ItemHeader"] | None:
+        """None if the file couldn't be read; warnings are logged"""
+        if (pending := self.__pending.pop(("item", path), None)) is not None:
+            records = self.__result(path, *pending)
+            return None if records is None else [r.to_header() for r in records]
+
+        key, records = self.__cached("item", path)
+        if records is not None:
+            return [record.to_header() for record in records]
+
+        # without a pool, live elements are used directly; only serialized if
+        # they're going into the cache
+        headers = load_ItemHeaders(path)
+        if headers is not None and self.cache is not None:
+            self.cache.put(key, path, [ItemRecord.from_header(h) for h in headers])
+        return headers
+
+    def text_record(self, path: Path, wanted: set[str] | None) -> TextRecord | None:
+        """None if the file couldn't be read; warnings are logged"""
+        if (pending := self.__pending.pop(("text", path), None)) is not None:
+            record = self.__result(path, *pending)
+
+        elif self.cache is None:
+            return load_TextRecord(path, wanted)
+
+        else:
+            key, record = self.cache.get("text", path)
+            if record is None and (record := load_TextRecord(path)) is not None:
+                self.cache.put(key, path, record)
+
+        if record is None or wanted is None:
+            return record
+
+        dictionary = {k: v for k, v in record.dictionary.items() if k in wanted}
+        return TextRecord(language=record.language, dictionary=dictionary)
+
+    def __cached(self, kind: str, path: Path) -> tuple[tuple, object | None]:
+        if self.cache is None:
+            return (), None
+        return self.cache.get(kind, path)
+
+    def __result(self, path: Path, key: tuple, future: Future):
+        records = future.result()
+        # key is empty if this came out of the cache in the first place
+        if self.cache is not None and records is not None:
+            self.cache.put(key, path, records)
+        return records
+
+
+def _done_future(result) -> Future:
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
+
+def main() -> None:
+    from argparse import ArgumentParser
+
+    # fmt: off
+    parser = ArgumentParser()
+    parser.add_argument("--content", nargs="*", action="extend", type=Path, help="path to barotrauma Content or workshop directory containing filelist.xml")
+    parser.add_argument("--output", nargs="?", type=Path, help="path to write package css and json files")
+    parser.add_argument("--package", nargs="*", action="append", dest="load_order", help="deprecated alias for --load-order")
+    parser.add_argument("--load-order", nargs="*", action="append", help="list of package names forming a load order")
+    parser.add_argument("--named-load-order", nargs="+", action="append", help="as --load-order but the first item will be used as the file name when writing the fragment")
+    parser.add_argument("--jobs-file", type=Path, help="json or json lines file of named load orders to build, each with its own --content and --output; see read_jobs()")
+    parser.add_argument("--jobs-summary", type=Path, help="write json of how each job in --jobs-file went to this file")
+    parser.add_argument("--no-index", action="store_const", const="no", dest="index", help="same as --index=no")
+    parser.add_argument("--index", choices=["no", "yes", "files"], default="yes", help="yes, writes index using given load order; files, makes an index including everything from the output directory")
+    parser.add_argument("--cache", type=Path, help="directory for keeping parsed content files and sprites between runs")
+    parser.add_argument("--sprite-cache-mb", type=int, default=256, help="remove least recently used sprites from --cache past this size")
+    parser.add_argument("--texture-cache-mb", type=int, default=1024, help="keep at most this much of decoded textures in memory")
+    parser.add_argument("--max-rss", type=int, help="MiB; drop decoded textures when this process is using more, exit with an error if that's not enough when checked between stages")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="parse content files with this many worker processes")
+    parser.add_argument("--sprites", choices=["inline", "atlas"], default="inline", help="inline, a data url per sprite in the css; atlas, packs sprites into webp images written next to the css, which index.ts doesn't list so it's only for viewing the output directory as it is")
+    parser.add_argument("--sprite-jobs", type=int, default=0, help="render sprites on this many worker processes instead of threads")
+    parser.add_argument("--bundle-jobs", type=int, default=0, help="bundle and write load orders on this many forked processes; keeps all texts read until they're done")
+    parser.add_argument("--compress", nargs="+", action="extend", choices=COMPRESSIONS, default=[], help="also write compressed copies of json and css files; br needs brotli, zst needs zstandard")
+    parser.add_argument("--metrics", type=Path, help="write json of time, counts, and peak rss for each stage to this file")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"], help="profile one stage, see --profile-stage")
+    parser.add_argument("--profile-stage", choices=STAGES, default="sprites", help="stage to --profile, every time it's entered")
+    parser.add_argument("--profile-output", type=Path, help="where to write the --profile, defaults to profile-STAGE.prof or .txt")
+    parser.add_argument("--warnings", type=Path, help="write warnings to this file as json lines, once each with a count of how many times it was logged")
+    parser.add_argument("--watch", action="store_true", help="after building, rebuild and write bundles when their content files change, only redoing what depends on the changed files")
+    parser.add_argument("--serve", type=Path, help="listen on this unix socket for load orders to build, keeping --content read in memory between them")
+    parser.add_argument("--serve-jobs", type=int, default=2, help="with --serve, build this many load orders at a time")
+    parser.add_argument("--serve-queue", type=int, default=16, help="with --serve, let this many more wait before turning them away")
+    parser.add_argument("--quiet", "-q", action="store_true", help="don't print warnings, only how many there were; unused attributes aren't checked unless also using --warnings")
+    # fmt: on
+
+    # log_warning("", argv=sys.argv)
+    args = parser.parse_args()
+    # log_warning("", args=args)
+
+    global _PROFILER, _CHECK_UNUSED_ATTRIBUTES, _MAX_RSS
+
+    if args.max_rss:
+        _MAX_RSS = args.max_rss << 20
+
+    if args.quiet:
+        _WARNINGS.quiet = True
+        _CHECK_UNUSED_ATTRIBUTES = args.warnings is not None
+
+    if args.profile:
+        suffix = ".prof" if args.profile == "cprofile" else ".txt"
+        path = args.profile_output or Path(f"profile-{args.profile_stage}{suffix}")
+        _PROFILER = StageProfiler(args.profile_stage, args.profile, path)
+
+    try:
+        build(args)
+    finally:
+        stage(None)
+
+        if _PROFILER is not None:
+            _PROFILER.dump()
+            logtime(f"wrote {_PROFILER.path}")
+
+        if args.warnings:
+            _WARNINGS.write_jsonl(args.warnings)
+            logtime(f"wrote {args.warnings}")
+
+        if args.metrics:
+            write_metrics(args.metrics)
+            logtime(f"wrote {args.metrics}")
+
+        if _WARNINGS.quiet:
+            for message, n in _WARNINGS.counts().most_common():
+                logtime(f"{n: 6} × {message}")
+
+        logtime(f"warnings » {_WARNINGS}")
+
+
+def build(args):
+    load_orders: list[list[str]] = []
+    # names for files of each load order, None to name it after its packages
+    load_order_names: list[str | None] = []
+    # where to write each load order, None for --output
+    outputs: list[Path | None] = []
+
+    if args.named_load_order:
+        for name, *order in args.named_load_order:
+            load_orders.append(order)
+            load_order_names.append(name)
+
+    if args.load_order:
+        load_orders += args.load_order
+        load_order_names += [None] * len(args.load_order)
+
+    outputs += [None] * len(load_orders)
+
+    content = list(args.content or ())
+    # more --content paths only seen by each load order
+    scopes: list[list[Path]] = [[] for _ in load_orders]
+    jobs: list[Job] = []
+    # {load order index: Job}
+    job_by_index: dict[int, Job] = {}
+
+    if args.jobs_file:
+        jobs = read_jobs(args.jobs_file)
+
+        for job in jobs:
+            if job.error is None:
+                job_by_index[len(load_orders)] = job
+                load_orders.append(job.load_order)
+                load_order_names.append(job.name)
+                outputs.append(job.output)
+                scopes.append(job.content)
+
+    _TEXTURE_CACHE.max_bytes = args.texture_cache_mb << 20
+
+    compressors: dict[str, Callable[[bytes], bytes]] = {}
+
+    for format in dict.fromkeys(args.compress):
+        try:
+            compressors[format] = compressor(format)
+        except ImportError as err:
+            log_warning("not compressing, module not installed", error=err)
+
+    if args.serve:
+        if load_orders or jobs or args.watch or not args.content:
+            log_warning("--serve needs --content and takes load orders from jobs")
+            raise SystemExit(1)
+
+    elif args.watch and (jobs or not (load_orders and args.output)):
+        log_warning("--watch needs a load order and --output, and no --jobs-file")
+        raise SystemExit(1)
+
+    sprites = SpriteOptions(atlas=args.sprites == "atlas", jobs=args.sprite_jobs)
+    cache = None
+
+    if args.cache:
+        _PATH_INDEX.directory = args.cache / "paths"
+        cache = ParseCache(args.cache / "parse")
+        sprites.cache = SpriteCache(args.cache / "sprites", args.sprite_cache_mb << 20)
+
+    # one pool of processes for rendering sprites of every bundle, instead of
+    # one per bundle; threads are cheap enough to start for each
+    if sprites.jobs > 1:
+        sprites.executor = _sprite_executor(sprites.jobs)
+
+    try:
+        if args.serve:
+            serve(
+                args.serve,
+                content,
+                sprites=sprites,
+                cache=cache,
+                compressors=compressors,
+                concurrency=args.serve_jobs,
+                backlog=args.serve_queue,
+            )
+            return
+
+        # a content package changing while watching can change what packages there
+        # are or what files they have, so that starts over from here
+        while True:
+            _IDENTIFIERS.clear()
+
+            state = BuildState(sprites, cache) if args.watch else None
+
+            # with jobs, a load order that isn't valid fails its job instead of
+            # exiting; otherwise init_bundles can raise SystemExit
+            invalid: dict[int, Warning] | None = {} if jobs else None
+
+            writing = bool(args.output or any(outputs))
+
+            if not writing:
+                log_warning("no --output path specified, not writing anything!")
+
+            written: list[WrittenBundle] = []
+
+            groups = [(content, list(range(len(load_orders))))]
+
+            if invalid is not None:
+                groups = group_load_orders(content, scopes, load_orders, invalid)
+
+            for group_content, indexes in groups:
+                if not indexes:
+                    continue
+
+                group_invalid = None if invalid is None else {}
+
+                finish = partial(
+                    finish_bundle,
+                    names=[load_order_names[i] for i in indexes],
+                    outputs=[outputs[i] or args.output for i in indexes],
+                    compressors=compressors,
+                )
+
+                bundles = init_bundles(
+                    group_content,
+                    [load_orders[i] for i in indexes],
+                    cache=cache,
+                    jobs=args.jobs,
+                    sprites=sprites,
+                    state=state,
+                    invalid=group_invalid,
+                    finish=finish if writing else None,
+                    bundle_jobs=args.bundle_jobs,
+                )
+
+                for k, warning in (group_invalid or {}).items():
+                    invalid[indexes[k]] = warning  # type: ignore
+
+                if writing:
+                    for bundle in bundles:
+                        bundle.index = indexes[bundle.index]
+                        written.append(bundle)
+
+            written.sort(key=lambda bundle: bundle.index)
+
+            for i, warning in (invalid or {}).items():
+                log_warning(warning.message, **warning.kwargs)
+                if (job := job_by_index.get(i)) is not None:
+                    job.fail(warning)
+
+            if not writing:
+                return
+
+            # {output directory: [(json path, css path), ...]}
+            by_output: dict[Path, list[tuple[Path, Path]]] = {}
+            # directories not indexed, since a bundle wasn't written to it
+            failed: set[Path] = set()
+
+            if args.output:
+                by_output[args.output] = []
+
+            for bundle in written:
+                job = job_by_index.get(bundle.index)
+
+                if bundle.paths is not None:
+                    by_output.setdefault(bundle.output, []).append(bundle.paths)
+                elif bundle.output is not None:
+                    failed.add(bundle.output)
+
+                if job is None:
+                    pass
+                elif bundle.error is not None:
+                    job.fail(bundle.error)
+                else:
+                    job.done(bundle)
+
+            for output, index in by_output.items():
+                if output not in failed:
+                    write_index(output, index, args.index)
+
+            if jobs:
+                report_jobs(jobs, args.jobs_summary)
+                if any(job.error is not None for job in jobs):
+                    raise SystemExit(1)
+
+            names = [bundle.name for bundle in written]
+
+            if state is None or not watch(args.output, state, names, compressors):
+                return
+
+    finally:
+        if sprites.executor is not None:
+            sprites.executor.shutdown()
+
+
+def group_load_orders(
+    content: list[Path],
+    scopes: list[list[Path]],
+    load_orders: list[list[str]],
+    invalid: dict[int, Warning],
+) -> list[tuple[list[Path], list[int]]]:
+    """
+    groups of load orders, as (content, [load order index, ...]), that can be
+    bundled together even though each only sees content and its own scope
+
+    packages are found by name, directory name, or workshop id; load orders
+    are only grouped if those lead to the same package for each of them, and if
+    none refer with %ModDir:id% to a package it can't see but another can
+
+    a load order with packages it can't see is put in invalid instead
+    """
+    # warnings from finding them are logged when bundling
+    found = {
+        path: [
+            package
+            for package in _find_ContentPackages([path])
+            if isinstance(package, ContentPackage)
+        ]
+        for path in dict.fromkeys(chain(content, *scopes))
+    }
+
+    # [(content, {(kind, key): path}, workshop ids some can't see, [index, ...])]
+    groups: list[tuple[list[Path], dict[tuple[str, str], Path], set[str], list[int]]]
+    groups = []
+
+    for i, (scope, load_order) in enumerate(zip(scopes, load_orders)):
+        paths = list(dict.fromkeys(content + scope))
+        packages = list(chain.from_iterable(found[path] for path in paths))
+
+        keys: dict[tuple[str, str], Path] = {}
+        for package in packages:
+            keys.setdefault(("name", package.name), package.xmlpath)
+            keys.setdefault(("dir", package.path.name), package.path)
+            if package.steamworkshopid:
+                keys.setdefault(("id", package.steamworkshopid), package.xmlpath)
+
+        names = {key for kind, key in keys if kind != "id"}
+        ids = {key for kind, key in keys if kind == "id"}
+
+        if missing := set(load_order) - names:
+            invalid[i] = Warning(
+                "some requested packages were not found under --content",
+                missing=missing,
+                available=names,
+            )
+            continue
+
+        unseen = set(chain.from_iterable(map(_moddir_targets, packages))) - ids
+
+        for group in groups:
+            _, group_keys, group_unseen, _ = group
+            if (
+                all(group_keys.get(key, path) == path for key, path in keys.items())
+                and not any(("id", mod_id) in group_keys for mod_id in unseen)
+                and group_unseen.isdisjoint(ids)
+            ):
+                break
+        else:
+            group = ([], {}, set(), [])
+            groups.append(group)
+
+        group_content, group_keys, group_unseen, indexes = group
+        group_content.extend(path for path in paths if path not in group_content)
+        group_keys.update(keys)
+        group_unseen.update(unseen)
+        indexes.append(i)
+
+    return [(group_content, indexes) for group_content, _, _, indexes in groups]
+
+
+def bundle_names(
+    load_order_names: list[str | None], bundles: list["Bundle"]
+) -> list[str]:
+    """file names for bundles, unnamed load orders are named by their packages"""
+    return [
+        name or mangled_filename(*(f"{p.name}-{p.version}" for p in bundle.load_order))
+        for name, bundle in zip(load_order_names, bundles)
+    ]
+
+
+@dataclass
+class WrittenBundle(object):
+    """how finish_bundle() went, small enough to send back from a worker"""
+
+    # index of the load order
+    index: int
+    name: str
+    output: Path | None
+    # json and css, None if not written
+    paths: tuple[Path, Path] | None = None
+    sheets: list[str] = field(default_factory=list)
+    entities: int = 0
+    processes: int = 0
+    error: Warning | None = None
+
+
+def finish_bundle(
+    i: int,
+    bundle: "Bundle",
+    *,
+    names: list[str | None],
+    outputs: list[Path | None],
+    compressors: dict[str, Callable[[bytes], bytes]],
+) -> WrittenBundle:
+    """writes a bundle to the output of its load order, see init_bundles()"""
+    [name] = bundle_names([names[i]], [bundle])
+
+    written = WrittenBundle(
+        i,
+        name,
+        outputs[i],
+        entities=len(bundle.entities),
+        processes=len(bundle.processes),
+    )
+
+    if written.output is None:
+        written.error = Warning("no output for job, and no --output")
+        return written
+
+    try:
+        [written.paths] = write_bundles(written.output, [(name, bundle)], compressors)
+    except OSError as err:
+        written.error = Warning(
+            "failed to write bundles", error=err, path=written.output
+        )
+        log_warning(written.error.message, **written.error.kwargs)
+    else:
+        written.sheets = list(bundle.sprites_sheets)
+
+    return written
+
+
+def write_bundles(
+    output: Path,
+    bundles: list[tuple[str, "Bundle"]],
+    compressors: dict[str, Callable[[bytes], bytes]],
+) -> list[tuple[Path, Path]]:
+    """returns paths to each bundle's json and css"""
+    index: list[tuple[Path, Path]] = []
+
+    stage("write")
+    output.mkdir(parents=True, exist_ok=True)
+
+    # compressed while the next bundle is written
+    compressing = ThreadPoolExecutor(max_workers=os.cpu_count())
+    compressed: list[Future[tuple[Path, int, int, int]]] = []
+
+    for name, bundle in bundles:
+        logtime(f"writing {bundle}")
+
+        stage("write", bundle=name)
+
+        bundle_path = (output / name).with_suffix(".json")
+        css_path = (output / name).with_suffix(".css")
+
+        css_path.open("w").write(bundle.sprites_css)
+        logtime(f"wrote {css_path}")
+        stage_count(files=1, bytes=css_path.stat().st_size)
+
+        for format, compress in compressors.items():
+            compressed.append(
+                compressing.submit(compress_file, css_path, format, compress)
+            )
+
+        for sheet_name, webp in bundle.sprites_sheets.items():
+            (output / sheet_name).write_bytes(webp)
+            logtime(f"wrote {output / sheet_name}")
+            stage_count(files=1, bytes=len(webp))
+
+        bundle_json = {
+            "name": name,
+            "load_order": bundle.load_order,
+            "entities": bundle.entities,
+            "processes": bundle.processes,
+            "i18n": bundle.i18n,
+        }
+        with bundle_path.open("w") as file:
+            dump_json(bundle_json, file)
+        logtime(f"wrote {bundle_path}")
+        stage_count(files=1, bytes=bundle_path.stat().st_size)
+
+        for format, compress in compressors.items():
+            compressed.append(
+                compressing.submit(compress_file, bundle_path, format, compress)
+            )
+
+        index.append((bundle_path, css_path))
+
+    stage("write")
+
+    with compressing:
+        for future in compressed:
+            try:
+                path, size, original_size, ns = future.result()
+            except OSError as err:
+                log_warning("failed to compress", error=err)
+                continue
+            logtime(
+                f"wrote {path} » {size} bytes"
+                f" » {size / (original_size or 1):.0%} » {ns / 1e6:.1f}ms"
+            )
+            stage_count(files=1, bytes=size)
+
+    return index
+
+
+def write_index(output: Path, index: list[tuple[Path, Path]], mode: str):
+    if mode == 'no':
+        return
+    
+    elif mode == 'files':
+        for bundle_path in output.glob("*.json"):
+            css_path = bundle_path.with_suffix(".css")
+            index.append((bundle_path, css_path))
+
+    index_path = output / "index.ts"
+
+    # nothing may have been written to it if every bundle went elsewhere
+    output.mkdir(parents=True, exist_ok=True)
+
+    with index_path.open("w") as f:
+        print("/* generated by baro-data.py */", file=f)
+
+        for i, (bundle_path, css_path) in enumerate(index):
+            print(
+                f'import {{ load_order as load_order{i}, name as name{i}, }} from "./{bundle_path.name}"',
+                file=f,
+            )
+            print(f'import bundle{i} from "./{bundle_path.name}?url"', file=f)
+            print(f'import sprites{i} from "./{css_path.name}?url"', file=f)
+
+        print("export const BUNDLES: LoadableBundle[] = [", file=f)
+        for i, _ in enumerate(index):
+            pass
+            print(
+                "{ "
+                "name: name%(i)d, "
+                "load_order: load_order%(i)d, "
+                "url: bundle%(i)d, "
+                "sprites: sprites%(i)d, "
+                "}," % {"i": i},
+                file=f,
+            )
+        print("]\n", file=f)
+
+        print(TYPES_TS, file=f)
+
+    logtime(f"wrote {len(index)} entries to {index_path}")
+
+
+@dataclass
+class Job(object):
+    """a named load order from --jobs-file, and how building it went"""
+
+    name: str
+    load_order: list[str]
+    content: list[Path]
+    output: Path | None
+    # a WarningRecord as json, for why it failed
+    error: dict | None = None
+    files: list[Path] = field(default_factory=list)
+    entities: int = 0
+    processes: int = 0
+
+    def fail(self, warning: Warning):
+        self.error = WarningRecord(warning.message, warning.kwargs).to_json()
+
+    def done(self, written: WrittenBundle):
+        assert written.paths is not None
+        self.files = list(written.paths)
+        self.files.extend(written.paths[0].with_name(name) for name in written.sheets)
+        self.entities = written.entities
+        self.processes = written.processes
+
+    def to_json(self) -> dict:
+        return {
+            "name": self.name,
+            "ok": self.error is None,
+            "error": self.error,
+            "output": None if self.output is None else str(self.output),
+            "files": [str(path) for path in self.files],
+            "entities": self.entities,
+            "processes": self.processes,
+        }
+
+
+def read_jobs(path: Path) -> list[Job]:
+    """
+    jobs from a file of a json array, or json lines, of objects like
+
+        {"name": "123", "load_order": ["1"], "content": ["mods/1"], "output": "out"}
+
+    where name and load_order are as for --named-load-order, content is added
+    to --content, and output is used instead of --output; both are optional
+
+    a job that can't be read has an error, exits if the file can't be read
+    """
+    try:
+        text = path.read_text()
+        if text.lstrip().startswith("["):
+            entries = json.loads(text)
+        else:
+            entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    except (OSError, ValueError) as err:
+        log_warning("failed to read --jobs-file", error=err, path=path)
+        raise SystemExit(1)
+
+    jobs: list[Job] = []
+
+    for n, entry in enumerate(entries):
+        try:
+            output = entry.get("output")
+            job = Job(
+                name=str(entry["name"]),
+                load_order=[str(package) for package in entry["load_order"]],
+                content=[Path(content) for content in entry.get("content", ())],
+                output=None if output is None else Path(output),
+            )
+        except (AttributeError, KeyError, TypeError) as err:
+            warning = Warning("bad job", error=err, job=n, path=path)
+            job = Job(name=str(n), load_order=[], content=[], output=None)
+            job.fail(warning)
+            log_warning(warning.message, **warning.kwargs)
+
+        if job.error is None and not is_file_name(job.name):
+            warning = Warning("bad job name", name=job.name, job=n, path=path)
+            job.fail(warning)
+            log_warning(warning.message, **warning.kwargs)
+
+        jobs.append(job)
+
+    return jobs
+
+
+def report_jobs(jobs: list[Job], path: Path | None):
+    """log how each job went, and write that as json to path"""
+    for job in jobs:
+        if job.error is None:
+            logtime(
+                f"job {job.name} » {job.entities} entities"
+                f" » {job.processes} processes » {len(job.files)} files"
+            )
+        else:
+            logtime(f"job {job.name} » failed » {job.error['message']}")
+
+    if path is not None:
+        with path.open("w") as file:
+            json.dump({"jobs": [job.to_json() for job in jobs]}, file, indent=1)
+        logtime(f"wrote {path}")
+
+
+def is_file_name(name: str) -> bool:
+    """
+    >>> is_file_name("123"), is_file_name("../x"), is_file_name(".x")
+    (True, False, False)
+    """
+    return bool(name) and name == Path(name).name and not name.startswith(".")
+
+
+def watch(
+    output: Path,
+    state: "BuildState",
+    names: list[str],
+    compressors: dict[str, Callable[[bytes], bytes]],
+) -> bool:
+    """
+    rebuild and write bundles when the files they're from change, until
+    interrupted; returns true if a content package changed and everything
+    should be built again instead
+
+    warnings are counted again for each rebuild, so they're printed again for
+    files that still have them
+    """
+    watcher = FileWatcher()
+
+    try:
+        while True:
+            files = state.files()
+            watcher.watch(files)
+            logtime(f"watching {len(files)} files » {watcher}")
+
+            changed = watcher.wait()
+            logtime(f"changed » {', '.join(map(str, sorted(changed)))}")
+
+            _WARNINGS.clear()
+
+            if state.manifests() & changed:
+                state.forget()
+                return True
+
+            rebuilt = state.rebuild(changed)
+            write_bundles(
+                output,
+                [(names[i], bundle) for i, bundle in rebuilt.items()],
+                compressors,
+            )
+            stage(None)
+
+            logtime(f"rebuilt {len(rebuilt)} bundles » warnings » {_WARNINGS}")
+
+    except KeyboardInterrupt:
+        return False
+
+    finally:
+        watcher.close()
+
+
+def serve(
+    path: Path,
+    content: list[Path],
+    *,
+    sprites: SpriteOptions,
+    cache: ParseCache | None,
+    compressors: dict[str, Callable[[bytes], bytes]],
+    concurrency: int,
+    backlog: int,
+):
+    """
+    build load orders sent over a unix socket at path, until interrupted
+
+    the packages under content, like vanilla, are read and bundled on their
+    own once, so their items, processes, and sprites are done before any job
+    comes in; each job is built in a forked process that starts with all that
+    and only reads the job's own packages
+
+    a job is a line of json like
+
+        {"name": "123", "content": ["/baro/mod/1"], "load_order": ["1"]}
+
+    with paths to mod directories and a load order, as with --content and
+    --named-load-order; the reply is a line of json like
+
+        {"ok": true, "error": null, "warnings": [...]}
+
+    followed by a tar stream of the files that would be written to --output;
+    or, if ok is false, nothing else
+
+    at most concurrency jobs are built at a time and at most backlog more
+    wait, connections past that are replied to with an error and closed
+    """
+    state = BuildState(sprites, cache)
+    init_bundles(content, [], cache=cache, sprites=sprites, state=state)
+    stage(None)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    path.unlink(missing_ok=True)
+    server.bind(str(path))
+    server.listen(backlog)
+    logtime(f"serving on {path} » {concurrency} at a time » {backlog} waiting")
+
+    waiting: deque[socket.socket] = deque()
+    # pids of forked processes building jobs
+    running: set[int] = set()
+
+    try:
+        while True:
+            while running and (pid := os.waitpid(-1, os.WNOHANG)[0]):
+                running.discard(pid)
+
+            while waiting and len(running) < concurrency:
+                conn = waiting.popleft()
+
+                if (pid := os.fork()) == 0:
+                    code = 1
+                    try:
+                        server.close()
+                        # the parent's pool isn't usable after forking
+                        sprites.executor = None
+                        code = serve_job(
+                            conn,
+                            state,
+                            sprites=sprites,
+                            cache=cache,
+                            compressors=compressors,
+                        )
+                    except Exception:
+                        # os._exit() doesn't let python print it
+                        print_exc()
+                    finally:
+                        os._exit(code)
+
+                conn.close()
+                running.add(pid)
+
+            if select([server], [], [], 0.05 if running else None)[0]:
+                conn, _ = server.accept()
+                if len(waiting) < backlog:
+                    waiting.append(conn)
+                else:
+                    with conn:
+                        conn.sendall(_job_reply(ok=False, error="busy", warnings=[]))
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        for conn in waiting:
+            conn.close()
+        server.close()
+        path.unlink(missing_ok=True)
+
+
+JOB_TIMEOUT = 30
+
+
+def serve_job(
+    conn: socket.socket,
+    state: "BuildState",
+    *,
+    sprites: SpriteOptions,
+    cache: ParseCache | None,
+    compressors: dict[str, Callable[[bytes], bytes]],
+) -> int:
+    """build a job sent to serve() and reply with it; returns an exit code"""
+    _WARNINGS.clear()
+    conn.settimeout(JOB_TIMEOUT)
+
+    with conn, conn.makefile("rb") as rfile, conn.makefile("wb") as wfile:
+        try:
+            job = json.loads(rfile.readline())
+            name = str(job["name"])
+            for key in ("content", "load_order"):
+                if not isinstance(job[key], list):
+                    raise TypeError(f"{key} should be a list")
+            content = [Path(path) for path in job["content"]]
+            load_order = [str(package) for package in job["load_order"]]
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            wfile.write(_job_reply(ok=False, error=f"bad job: {err!r}"))
+            return 1
+
+        if not is_file_name(name):
+            wfile.write(_job_reply(ok=False, error=f"bad job name: {name!r}"))
+            return 1
+
+        logtime(f"job {name} » {load_order}")
+
+        with TemporaryDirectory() as temp:
+            output = Path(temp)
+
+            try:
+                (bundle,) = init_bundles(
+                    content, [load_order], cache=cache, sprites=sprites, state=state
+                )
+                write_bundles(output, [(name, bundle)], compressors)
+            except SystemExit:
+                wfile.write(_job_reply(ok=False, error="build failed"))
+                return 1
+            except Exception as err:
+                print_exc()
+                wfile.write(_job_reply(ok=False, error=repr(err)))
+                return 1
+
+            stage(None)
+
+            wfile.write(_job_reply(ok=True))
+
+            with tarfile.open(fileobj=wfile, mode="w|") as tar:
+                for path in sorted(output.iterdir()):
+                    tar.add(path, arcname=path.name)
+
+    logtime(f"job {name} done » warnings » {_WARNINGS}")
+
+    return 0
+
+
+def _job_reply(*, ok: bool, error: str | None = None, warnings=None) -> bytes:
+    if warnings is None:
+        warnings = _WARNINGS.to_json()
+    reply = {"ok": ok, "error": error, "warnings": warnings}
+    return json.dumps(reply).encode() + b"\n"
+
+
+class FileWatcher(object):
+    """
+    waits for files to change; with inotify, through ctypes, on linux and
+    otherwise by polling their sizes and modification times
+
+    inotify watches the directories the files are in, since editors often save
+    by writing another file and renaming it over the one being watched
+
+    changes that come in quick succession, like saving a few files at once,
+    are waited for and returned together
+    """
+
+    # IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+    INOTIFY_MASK = 0x8 | 0x40 | 0x80 | 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+
+    def __init__(self, settle: float = 0.05, interval: float = 0.5):
+        self.settle = settle
+        self.interval = interval
+        self.files: set[Path] = set()
+        # {path: (size, mtime_ns) or None if not found} when polling
+        self.__stats: dict[Path, tuple[int, int] | None] = {}
+        # {watch descriptor: directory} when using inotify
+        self.__directories: dict[int, Path] = {}
+        self.__libc: Any = None
+        self.__fd = -1
+
+        try:
+            self.__libc, self.__fd = _inotify_init()
+        except OSError as err:
+            log_warning("inotify not available, polling for changes", error=err)
+
+    def __str__(self):
+        if self.__fd < 0:
+            return f"polling every {self.interval}s"
+        return f"inotify » {len(self.__directories)} directories"
+
+    def watch(self, files: set[Path]):
+        self.files = files
+
+        if self.__fd < 0:
+            self.__stats = {
+                path: self.__stats[path] if path in self.__stats else _file_stat(path)
+                for path in files
+            }
+            return
+
+        watched = set(self.__directories.values())
+
+        for directory in {path.parent for path in files} - watched:
+            wd = self.__libc.inotify_add_watch(
+                self.__fd, os.fsencode(directory), self.INOTIFY_MASK
+            )
+            if wd < 0:
+                error = OSError(_errno(), os.strerror(_errno()), str(directory))
+                log_warning("failed to watch directory", error=error)
+            else:
+                self.__directories[wd] = directory
+
+    def wait(self) -> set[Path]:
+        """blocks until some files change, returns the ones that did"""
+        changed: set[Path] = set()
+
+        while not changed:
+            changed = self.__changes(None)
+
+        while more := self.__changes(self.settle):
+            changed |= more
+
+        return changed
+
+    def close(self):
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
+
+    def __changes(self, timeout: float | None) -> set[Path]:
+        if self.__fd < 0:
+            sleep(self.interval if timeout is None else timeout)
+            return self.__poll()
+
+        if not select([self.__fd], [], [], timeout)[0]:
+            return set()
+
+        return self.__read()
+
+    def __poll(self) -> set[Path]:
+        changed: set[Path] = set()
+
+        for path, before in self.__stats.items():
+            if (after := _file_stat(path)) != before:
+                self.__stats[path] = after
+                changed.add(path)
+
+        return changed
+
+    def __read(self) -> set[Path]:
+        changed: set[Path] = set()
+        data = os.read(self.__fd, 1 << 16)
+        offset = 0
+
+        # struct inotify_event { int wd; u32 mask, cookie, len; char name[]; }
+        while offset < len(data):
+            wd, mask, _, size = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16 : offset + 16 + size].rstrip(b"\0")
+            offset += 16 + size
+
+            if mask & self.IN_Q_OVERFLOW:
+                return set(self.files)
+
+            if mask & self.IN_IGNORED:
+                # the directory is gone, maybe watched again in watch()
+                self.__directories.pop(wd, None)
+                continue
+
+            if (directory := self.__directories.get(wd)) is None:
+                continue
+
+            if (path := directory / os.fsdecode(name)) in self.files:
+                changed.add(path)
+
+        return changed
+
+
+def _inotify_init() -> tuple[Any, int]:
+    """returns libc and an inotify file descriptor, raises OSError if there is
+    no inotify"""
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError("no inotify_init1 in libc")
+
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+
+    if (fd := libc.inotify_init1(os.O_CLOEXEC)) < 0:
+        raise OSError(_errno(), os.strerror(_errno()))
+
+    return libc, fd
+
+
+def _errno() -> int:
+    import ctypes
+
+    return ctypes.get_errno()
+
+
+def _file_stat(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _find_ContentPackages(paths: list[Path]) -> Iterator[ContentPackage | Warning]:
+    for path in paths:
+        found = [
+            (xmlpath, element)
+            for xmlpath in _ContentPackage_candidates(path)
+            if (element := find_ContentPackage_element(xmlpath)) is not None
+        ]
+
+        if not found:
+            # not where they usually are, so peek at every xml file under the
+            # path; the index remembers which ones were packages
+            found = [
+                (xmlpath, element)
+                for xmlpath in _PATH_INDEX.package_xmls(path, _is_ContentPackage)
+                if (element := find_ContentPackage_element(xmlpath)) is not None
+            ]
+
+        for xmlpath, element in found:
+            for item in extract_ContentPackageHeader(element):
+                if isinstance(item, Warning):
+                    yield item.with_path(xmlpath)
+                else:
+                    # FIXME this can bind multiple ContentPackages to the
+                    # same path, which will not work
+                    yield ContentPackage(
+                        path=path, xmlpath=xmlpath, element=element, **asdict(item)
+                    )
+
+
+def _ContentPackage_candidates(path: Path) -> list[Path]:
+    """
+    where content packages usually are; a mod's filelist.xml, other xml files
+    at the top of the path, and ContentPackages/*.xml like Vanilla.xml
+    """
+    top: list[Path] = []
+    nested: list[Path] = []
+
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = entry.name.lower()
+                if name.endswith(".xml") and entry.is_file():
+                    top.append(Path(entry.path))
+                elif name == "contentpackages" and entry.is_dir():
+                    with os.scandir(entry.path) as subentries:
+                        nested.extend(
+                            Path(sub.path)
+                            for sub in subentries
+                            if sub.name.lower().endswith(".xml") and sub.is_file()
+                        )
+    except OSError as err:
+        log_warning("failed to list directory", error=err, path=path)
+
+    top.sort(key=lambda p: (p.name.lower() != "filelist.xml", p.name))
+    nested.sort()
+
+    return top + nested
+
+
+def _is_ContentPackage(xmlpath: Path) -> bool:
+    return find_ContentPackage_element(xmlpath) is not None
+
+
+def _find_core_package_or_exit(packages: list[ContentPackage]) -> ContentPackage:
+    is_core, non_core = partition(packages, lambda p: p.iscorepackage)
+
+    if len(is_core) != 1:
+        log_warning(
+            "expected exactly one contentpackage to be marked a corepackage",
+            iscorepackage=set(p.name for p in is_core),
+            notcorepackage=set(p.name for p in non_core),
+        )
+        raise SystemExit(1)
+
+    return is_core[0]
+
+
+def _validate_load_order_or_exit(
+    vanilla: ContentPackage,
+    packages: list[ContentPackage],
+    load_order_list: list[list[str]] | None,
+    invalid: dict[int, Warning] | None = None,
+) -> list[list[ContentPackage]]:
+    """
+    with invalid, load orders that aren't valid are left out and put in it by
+    their index, instead of logging why and exiting
+    """
+    if not load_order_list:
+        return [[vanilla]]
+
+    package_load_order_list = []
+    package_by_name = {package.name: package for package in packages}
+    package_by_path = {package.path.name: package for package in packages}
+    package_names = set(chain(package_by_name, package_by_path))
+
+    for i, load_order in enumerate(load_order_list):
+        package_load_order: list[ContentPackage] | Warning
+
+        if missing := set(load_order) - package_names:
+            package_load_order = Warning(
+                "some requested packages were not found under --content",
+                missing=missing,
+                available=package_names,
+            )
+
+        else:
+            package_load_order = [
+                package_by_path.get(name) or package_by_name[name]
+                for name in load_order
+            ]
+
+            if package_load_order and package_load_order[0].iscorepackage:
+                pass
+
+            elif any(p.iscorepackage for p in package_load_order):
+                package_load_order = Warning(
+                    "corepackage found in load order but not the first item",
+                    shouldbefirst=vanilla,
+                )
+
+            else:
+                package_load_order = [vanilla] + package_load_order
+
+        if not isinstance(package_load_order, Warning):
+            package_load_order_list.append(package_load_order)
+
+        elif invalid is None:
+            log_warning(package_load_order.message, **package_load_order.kwargs)
+            raise SystemExit(1)
+
+        else:
+            invalid[i] = package_load_order
+
+    return package_load_order_list
+
+
+def _resolve_content_package_paths(
+    vanilla: ContentPackage,
+    current: ContentPackage,
+    packages: dict[str, ContentPackage],
+) -> tuple[list[Path], list[Path]]:
+    """returns (items, texts), packages is by workshop id"""
+    items: list[Path] = []
+    texts: list[Path] = []
+
+    convert_path = partial(
+        resolve_path,
+        vanilla=vanilla,
+        current=current,
+        packages=packages,
+    )
+    content_paths = extract_ContentPath(current.element, convert_path)
+
+    for content in log_warnings(content_paths, path=current.xmlpath):
+        if content.kind == "item":
+            items.append(content.path)
+        elif content.kind == "text":
+            texts.append(content.path)
+        else:
+            assert False, content.kind
+
+    return items, texts
+
+
+def _moddir_targets(package: ContentPackage) -> set[str]:
+    """workshop ids of other packages with files this one lists by %ModDir:id%"""
+    targets: set[str] = set()
+
+    for child in skip_comments(package.element):
+        for key, value in child.attrib.items():
+            if key.lower() == "file" and (prefix := mod_prefix(value)):
+                mod_id, _ = prefix
+                if mod_id is not None and mod_id != package.steamworkshopid:
+                    targets.add(mod_id)
+
+    return targets
 
 
 def _iter_content_package_preitems(
-    package: ContentPackage, item_paths: list[Path]
+    package: ContentPackage, item_paths: list[Path], reader: ContentReader
 ) -> Iterator[PreItem]:
-    for xmlpath, doc in load_xmls(item_paths):
-        for item in extract_ItemHeader(doc.getroot()):
+    for xmlpath in item_paths:
+        if (headers := reader.item_headers(xmlpath)) is None:
+            continue
+
+        for item in headers:
 
             # hack when loading sprites to know what context a %ModDir% was
             # used in; this must survive apply_variant and not break it
@@ -1652,57 +4123,131 @@ class InfoTexts(object):
 
 
 def _iter_content_package_infotexts(
-    package: ContentPackage, text_paths: list[Path]
+    package: ContentPackage,
+    text_paths: list[Path],
+    reader: ContentReader,
+    wanted: set[str] | None,
 ) -> Iterator[InfoTexts]:
-    for xmlpath, doc in load_xmls(text_paths):
+    for xmlpath in text_paths:
+        record = reader.text_record(xmlpath, wanted)
+
+        if record is not None and record.language:
+            yield InfoTexts(package=package, **asdict(record))
+
+
+def load_TextRecord(path: Path, wanted: set[str] | None = None) -> TextRecord | None:
+    """
+    stream an infotexts xml file, keeping only texts with keys in `wanted`, or
+    everything if `wanted` is None
+
+    returns None and logs a warning if the file can't be read
+    """
+    try:
+        with path.open("rb") as file:
+            return _iterparse_TextRecord(file, wanted)
+
+    except (OSError, etree.Error) as err:
+        log_warning(err, file=path)
+        return None
+
 
-        # TODO this assumes that root.tag == infotexts I guess?
-        root = doc.getroot()
+def _iterparse_TextRecord(file, wanted: set[str] | None) -> TextRecord:
+    # TODO this assumes that root.tag == infotexts I guess?
+    root = None
+    dictionary: dict[str, str] = {}
+    # lowercase tags from the root to the element being parsed
+    tags: list[str] = []
 
-        if not (language := root.get("language")):
+    for event, element in etree.iterparse(file, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+                if not root.get("language"):
+                    return TextRecord(language="", dictionary={})
+
+            tags.append(element.tag.lower())
             continue
 
-        # TODO warn about duplicates?
-        dictionary = dict(_iter_infotext_items(root))
+        tag = tags.pop()
 
-        if language not in dictionary and (language_name := root.get("translatedname")):
-            dictionary[language] = language_name
+        # texts are children of the root or nested in <override>; drop them
+        # after reading them so only the root is kept around
+        if tags and all(t == "override" for t in tags[1:]):
+            # TODO warn about duplicates?
+            if tag != "override" and element.text and (msg := _infotext_key(tag)):
+                if wanted is None or msg in wanted:
+                    dictionary[msg] = element.text
 
-        yield InfoTexts(package=package, language=language, dictionary=dictionary)
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]  # type: ignore
 
+    if root is None:
+        return TextRecord(language="", dictionary={})
 
-def _iter_infotext_items(element: etree._Element) -> Iterator[tuple[str, str]]:
-    for child in skip_comments(element):
-        tag = child.tag.lower()
+    language = root.get("language")
 
-        if tag == "override":
-            yield from _iter_infotext_items(child)
+    if (
+        language not in dictionary
+        and (wanted is None or language in wanted)
+        and (language_name := root.get("translatedname"))
+    ):
+        dictionary[language] = language_name
 
-        elif not child.text:
-            pass
+    return TextRecord(language=language, dictionary=dictionary)
 
-        elif tag == "credit":
-            yield "$", child.text
 
-        elif tag in ("fabricatorrequiresrecipe", "random"):
-            yield tag, child.text
+def _infotext_key(tag: str) -> str | None:
+    if tag == "credit":
+        return "$"
 
-        else:
-            # fmt: off
-            msg = (   drop_prefix(tag, "entityname.")
-                   or drop_prefix(tag, "npctitle.") # merchants
-                   or drop_prefix(tag, "fabricationdescription.")) # munition_core etc
-            # fmt: on
-            yield msg, child.text
+    elif tag in ("fabricatorrequiresrecipe", "random"):
+        return tag
+
+    else:
+        # fmt: off
+        return (   drop_prefix(tag, "entityname.")
+                or drop_prefix(tag, "npctitle.") # merchants
+                or drop_prefix(tag, "fabricationdescription.")) # munition_core etc
+        # fmt: on
 
 
-@dataclass
+@dataclass(slots=True)
 class ItemHeader(object):
     element: etree._Element
     identifier: Identifier
     variant_of: Identifier | None
 
 
+# the only children of <Item> that anything reads, the rest are dropped after
+# parsing item files; <Clear/> is kept for apply_variant
+ITEM_CHILD_TAGS = frozenset(
+    ("fabricate", "deconstruct", "price", "sprite", "inventoryicon", "clear")
+)
+
+
+def load_ItemHeaders(path: Path) -> list[ItemHeader] | None:
+    """
+    parse an items xml file, keeping only the attributes of each item and its
+    children in ITEM_CHILD_TAGS
+
+    returns None and logs a warning if the file can't be read
+    """
+    # iterparse would avoid building the whole tree but costs about twice as
+    # much time in python per element; one file's tree is not a lot of memory
+    parser = etree.XMLParser(remove_comments=True, remove_pis=True)
+
+    try:
+        with path.open("rb") as file:
+            root = etree.parse(file, parser).getroot()
+
+    except (OSError, etree.Error) as err:
+        log_warning(err, file=path)
+        return None
+
+    return list(extract_ItemHeader(root))
+
+
 def extract_ItemHeader(element: etree._Element) -> Iterator[ItemHeader]:
     element_tag = element.tag.lower()
 
@@ -1729,6 +4274,13 @@ def _extract_element_ItemHeader(items) -> Iterator[ItemHeader]:
         if not (identifier := a.opt("identifier", convert=make_identifier)):
             continue
 
+        # the item keeps the rest of the document alive, so this cuts what is
+        # held on to until bundling by a lot; sourceline is kept by not copying
+        for child in list(item):
+            tag = child.tag
+            if not isinstance(tag, str) or tag.lower() not in ITEM_CHILD_TAGS:
+                item.remove(child)
+
         yield ItemHeader(
             element=item,
             identifier=identifier,
@@ -1744,7 +4296,7 @@ class BundlePackageMeta(object):
     steamworkshopid: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class BundleEntity(object):
     identifier: Identifier
     tags: list[Identifier]
@@ -1759,7 +4311,9 @@ class Bundle(object):
     processes: list[Process]
     # {language: {identifier: humantext}}
     i18n: dict[str, dict[str, str]]
-    sprites_css: StringIO
+    sprites_css: str
+    # {file name: webp} referenced by sprites_css
+    sprites_sheets: dict[str, bytes]
 
     def __str__(self):
         return ", ".join(l.name for l in self.load_order)
@@ -1768,11 +4322,239 @@ class Bundle(object):
 FILENAME_MANGLE_PATTERN = re.compile(r"[^a-z0-9]", flags=re.IGNORECASE)
 
 
+COMPRESSIONS = ("gz", "br", "zst")
+
+
+def compressor(format: str) -> Callable[[bytes], bytes]:
+    """raises ImportError if br or zst modules are not installed
+
+    >>> import gzip
+    >>> gzip.decompress(compressor("gz")(b"hello"))
+    b'hello'
+    """
+    if format == "gz":
+        import gzip
+
+        # no mtime so the output is the same for the same input
+        return partial(gzip.compress, compresslevel=9, mtime=0)
+
+    elif format == "br":
+        import brotli  # type: ignore
+
+        return partial(brotli.compress, quality=11)
+
+    elif format == "zst":
+        import zstandard  # type: ignore
+
+        # compressor objects aren't safe to share between threads
+        return lambda data: zstandard.ZstdCompressor(level=19).compress(data)
+
+    else:
+        raise ValueError(format)
+
+
+def compress_file(
+    path: Path, format: str, compress: Callable[[bytes], bytes]
+) -> tuple[Path, int, int, int]:
+    """writes path.format, returns (that path, its size, path's size, ns taken)"""
+    start = monotonic_ns()
+    data = path.read_bytes()
+    compressed_path = path.with_name(f"{path.name}.{format}")
+    compressed_path.write_bytes(compressed := compress(data))
+    return compressed_path, len(compressed), len(data), monotonic_ns() - start
+
+
 def mangled_filename(*parts: str) -> str:
     return "+".join(FILENAME_MANGLE_PATTERN.sub("-", p) for p in parts)[:128]
 
 
-def init_bundles(content: list[Path], requested_packages: list[list[str]]) -> list[Bundle]:
+class BuildState(object):
+    """
+    what init_bundles read, by the file it was read from, so bundles can be
+    rebuilt after some of those files change by only reading and doing again
+    what depends on them
+
+    - an item file's PreItems are replaced and SharedWork forgets the old ones,
+      along with variants applied with any of them in their chain, so items
+      that are a variant of a changed item, in any package, are redone too;
+      and so are the baro items and processes read from those elements
+    - a texture's sprites are dropped from SharedWork and the TextureCache
+    - a text file's texts are replaced
+    - a bundle is redone if its load order has a package with a changed item
+      file or texture, everything that didn't change is in SharedWork from
+      before; or only localized again if just text files changed
+    """
+
+    def __init__(self, sprites: SpriteOptions, cache: ParseCache | None):
+        self.sprites = sprites
+        self.cache = cache
+        self.shared = SharedWork()
+        self.package_me: list[list[ContentPackage]] = []
+        # {package name: (item paths, text paths)}
+        self.content_paths: dict[str, tuple[list[Path], list[Path]]] = {}
+        # {package name: {item path: [PreItem, ...]}}
+        self.preitems: dict[str, dict[Path, list[PreItem]]] = {}
+        # {package name: {text path: [InfoTexts, ...]}}
+        self.texts: dict[str, dict[Path, list[InfoTexts]]] = {}
+        # [(Bundle, keys it needs localized), ...] by load order
+        self.bundles: list[tuple[Bundle, set[str]]] = []
+        # every package found, including ones not in a load order
+        self.found: list[ContentPackage] = []
+
+    def packages(self) -> dict[str, ContentPackage]:
+        return {package.name: package for package in chain(*self.package_me)}
+
+    def manifests(self) -> set[Path]:
+        return {package.xmlpath for package in chain(*self.package_me)}
+
+    def forget(self):
+        """
+        drop what's remembered about the files of every package found, for
+        building again from the start after a content package changed, since it
+        may list files that weren't there before
+
+        >>> with TemporaryDirectory() as temp:
+        ...     root = Path(temp)
+        ...     _ = (root / "filelist.xml").write_text(
+        ...         '<contentpackage name="m" modversion="1" gameversion="1" />'
+        ...     )
+        ...     state = BuildState(SpriteOptions(), None)
+        ...     state.found = list(_find_ContentPackages([root]))
+        ...     before = _PATH_INDEX.find(root, "items/extra.xml")
+        ...     (root / "Items").mkdir()
+        ...     _ = (root / "Items" / "Extra.xml").write_text("<Items />")
+        ...     state.forget()
+        ...     after = _PATH_INDEX.find(root, "items/extra.xml")
+        ...     before, after == root / "Items" / "Extra.xml"
+        (None, True)
+        """
+        for package in self.found:
+            _PATH_INDEX.forget(package.path)
+        _TEXTURE_CACHE.clear()
+
+    def files(self) -> set[Path]:
+        """content packages, item and text files, and textures sprites are from"""
+        files = self.manifests()
+        for items, texts in self.content_paths.values():
+            files.update(items, texts)
+        files.update(texture_path for texture_path, *_ in self.shared.sprites)
+        return files
+
+    def rebuild(self, changed: set[Path]) -> dict[int, Bundle]:
+        """bundles redone because of these files, by the index of their load
+        order; content packages changing isn't handled"""
+        packages = self.packages()
+        # package names, of ones with texts that changed and ones with
+        # anything else that changed
+        dirty_texts: set[str] = set()
+        dirty: set[str] = set()
+
+        for path in changed:
+            # may still be in the path index and found when resolving textures
+            if not path.exists():
+                for package in packages.values():
+                    if path.is_relative_to(package.path):
+                        _PATH_INDEX.forget(package.path)
+
+            if self.shared.forget_texture(path):
+                _TEXTURE_CACHE.forget(path)
+                dirty.update(
+                    package.name
+                    for package in packages.values()
+                    if path.is_relative_to(package.path)
+                )
+
+        stage("parse")
+
+        with ContentReader(cache=self.cache) as reader:
+            for name, preitems in self.preitems.items():
+                for xmlpath in changed.intersection(preitems):
+                    self.shared.forget(preitems[xmlpath])
+                    preitems[xmlpath] = list(
+                        _iter_content_package_preitems(
+                            packages[name], [xmlpath], reader
+                        )
+                    )
+                    stage_count(files=1, items=len(preitems[xmlpath]))
+                    logtime(f"{name} » {xmlpath} » {len(preitems[xmlpath])} items")
+                    dirty.add(name)
+
+            stage("i18n")
+
+            for name, texts in self.texts.items():
+                for xmlpath in changed.intersection(texts):
+                    texts[xmlpath] = list(
+                        _iter_content_package_infotexts(
+                            packages[name], [xmlpath], reader, None
+                        )
+                    )
+                    stage_count(files=1)
+                    logtime(f"{name} » {xmlpath} » {len(texts[xmlpath])} texts")
+                    dirty_texts.add(name)
+
+        preitem_by_package = {
+            name: preitems_by_identifier(preitems)
+            for name, preitems in self.preitems.items()
+        }
+        texts_by_package = {
+            name: list(chain(*texts.values())) for name, texts in self.texts.items()
+        }
+        bundles: dict[int, Bundle] = {}
+
+        for i, load_order in enumerate(self.package_me):
+            names = {package.name for package in load_order}
+
+            if not dirty.isdisjoint(names):
+                logtime(f"bundling {[p.name for p in load_order]}")
+                self.bundles[i] = init_bundle(
+                    load_order, preitem_by_package, self.sprites, self.shared
+                )
+
+            elif dirty_texts.isdisjoint(names):
+                continue
+
+            stage("i18n")
+            bundle, should_localize = self.bundles[i]
+            localize_bundle(bundle, load_order, texts_by_package, should_localize)
+            bundles[i] = bundle
+
+        if self.sprites.cache is not None:
+            self.sprites.cache.flush()
+
+        logtime(f"shared between bundles » {self.shared}")
+
+        return bundles
+
+
+def init_bundles(
+    content: list[Path],
+    requested_packages: list[list[str]],
+    *,
+    cache: ParseCache | None = None,
+    jobs: int = 0,
+    sprites: SpriteOptions | None = None,
+    state: "BuildState | None" = None,
+    invalid: dict[int, Warning] | None = None,
+    finish: Callable[[int, Bundle], T] | None = None,
+    bundle_jobs: int = 0,
+) -> list:
+    """
+    with a state, everything read is kept in it instead of being dropped after
+    the last bundle it's used in, see BuildState.rebuild(); and packages read
+    into it before aren't found or read again, see serve()
+
+    with invalid, load orders that aren't valid are put in it by their index
+    and not bundled; otherwise this exits
+
+    with finish, it's called with each bundle once it's localized, and the
+    index of its load order in requested_packages; what it returns is returned
+    instead of the bundles; with more than one bundle_jobs and no state, that's
+    done on forked processes, see _bundle_in_pool()
+    """
+    if sprites is None:
+        sprites = SpriteOptions()
+
+    stage("discovery")
     logtime("finding contentpackage")
 
     # the ordering of --content is not important
@@ -1781,51 +4563,363 @@ def init_bundles(content: list[Path], requested_packages: list[list[str]]) -> li
     package_me: list[list[ContentPackage]]
     packages: list[ContentPackage]
 
-    packages = list(log_warnings(_rglob_for_ContentPackages(content)))
+    packages = list(log_warnings(_find_ContentPackages(content)))
+
+    if state is not None:
+        packages = state.found = state.found + packages
+
     logtime(f"packages: {', '.join(package.name for package in packages)}")
+    stage_count(packages=len(packages))
 
     # sanity checks
 
     vanilla = _find_core_package_or_exit(packages)
-    package_me = _validate_load_order_or_exit(vanilla, packages, requested_packages)
+    package_me = _validate_load_order_or_exit(
+        vanilla, packages, requested_packages, invalid
+    )
+
+    # the last load order each package is in; after bundling or localizing that
+    # one, what was read from the package is dropped
+    last_use = {
+        package.name: i
+        for i, load_order in enumerate(package_me)
+        for package in load_order
+    }
+
+    if state is not None:
+        state.package_me = package_me
+
+    package_by_workshop_id = by_workshop_id(packages)
+
+    # only packages in a load order are read; others are still found so that
+    # %ModDir:id% paths can refer to them, their files are read as part of the
+    # package referring to them
+    used_packages = list({p.name: p for p in chain(*package_me)}.values())
+    referenced = {
+        package_by_workshop_id[mod_id].name
+        for package in used_packages
+        for mod_id in _moddir_targets(package)
+        if mod_id in package_by_workshop_id
+    }
+    skipped = [
+        package.name
+        for package in packages
+        if package.name not in last_use and package.name not in referenced
+    ]
+
+    if skipped:
+        logtime(f"not in a load order, skipping: {', '.join(skipped)}")
+    stage_count(skipped=len(skipped))
+
+    # index into requested_packages of each load order bundled
+    requested_index = [
+        i for i in range(len(requested_packages)) if i not in (invalid or ())
+    ]
+
+    pooled = finish is not None and bundle_jobs > 1 and state is None
 
     # parse item xml; read identifier and variantof
 
+    stage("parse")
     logtime("reading item identifiers...")
 
     preitems: dict[str, dict[Identifier, PreItem]] = {}
-    alltexts: dict[str, list[InfoTexts]] = {}
 
-    for package in packages:
-        items, texts = _resolve_content_package_paths(vanilla, package, packages)
+    # {package name: {item path: [PreItem, ...]}} and {package name: {text
+    # path: [InfoTexts, ...]}} of packages read before
+    read_items = {} if state is None else state.preitems
+    read_texts = {} if state is None else state.texts
+
+    content_paths = {
+        package.name: _resolve_content_package_paths(
+            vanilla, package, package_by_workshop_id
+        )
+        for package in packages
+        if package.name in last_use and package.name not in read_items
+    }
+
+    if state is not None:
+        content_paths.update(state.content_paths)
+
+    with ContentReader(cache=cache, jobs=jobs) as reader:
+        for name, (items, _) in content_paths.items():
+            if name not in read_items:
+                reader.prefetch_items(items)
+
+        for package in packages:
+            if package.name not in last_use:
+                continue
+
+            items, _ = content_paths[package.name]
+
+            if (_by_file := read_items.get(package.name)) is not None:
+                preitems[package.name] = preitems_by_identifier(_by_file)
+                continue
+
+            _by_file = {
+                xmlpath: list(
+                    _iter_content_package_preitems(package, [xmlpath], reader)
+                )
+                for xmlpath in items
+            }
+            _index = preitems[package.name] = preitems_by_identifier(_by_file)
+            stage_count(files=len(items), items=len(_index))
+            logtime(f"{package.name} » {len(_index)} items")
+
+            if state is not None:
+                state.content_paths[package.name] = content_paths[package.name]
+                state.preitems[package.name] = _by_file
+
+        # build bundles for output
+
+        bundles: list[Bundle] = []
+        should_localize_by_bundle: list[set[str]] = []
+
+        shared = SharedWork() if state is None else state.shared
+
+        for i, load_order in enumerate(() if pooled else package_me):
+            logtime(f"bundling {[p.name for p in load_order]}")
+            bundle, should_localize = init_bundle(
+                load_order, preitems, sprites, shared
+            )
+            bundles.append(bundle)
+            should_localize_by_bundle.append(should_localize)
+
+            if state is not None:
+                state.bundles.append((bundle, should_localize))
+                continue
+
+            for package in load_order:
+                if last_use[package.name] == i and package.name in preitems:
+                    shared.forget(list(preitems.pop(package.name).values()))
+
+        # texts are read last, only from packages in a load order, and only
+        # keeping what some bundle wants to localize; or all of them if they
+        # might be wanted by a rebuild or by bundles that aren't done yet
+
+        stage("i18n")
+        logtime("reading texts...")
+
+        wanted: set[str] | None = set().union(*should_localize_by_bundle)
+
+        if state is not None or pooled:
+            wanted = None
 
-        _index = preitems[package.name] = {}
-        for preitem in _iter_content_package_preitems(package, items):
-            _index[preitem.identifier] = preitem
-        logtime(f"{package.name} » {len(_index)} items")
+        for package in used_packages:
+            _, texts = content_paths[package.name]
+            if package.name not in read_texts:
+                reader.prefetch_texts(texts, wanted)
 
-        _texts = alltexts[package.name] = []
-        _texts.extend(_iter_content_package_infotexts(package, texts))
-        _words_count = sum(len(i.dictionary) for i in _texts)
-        logtime(f"{package.name} » {len(_texts)} texts » {_words_count} words")
+        alltexts: dict[str, list[InfoTexts]] = {}
 
-    # build bundles for output
+        for package in used_packages:
+            _, texts = content_paths[package.name]
 
-    bundles: list[Bundle] = []
+            if (_texts_by_file := read_texts.get(package.name)) is not None:
+                alltexts[package.name] = list(chain(*_texts_by_file.values()))
+                continue
+
+            _texts_by_file = {
+                xmlpath: list(
+                    _iter_content_package_infotexts(
+                        package, [xmlpath], reader, wanted
+                    )
+                )
+                for xmlpath in texts
+            }
+            _texts = alltexts[package.name] = list(chain(*_texts_by_file.values()))
+            _words_count = sum(len(i.dictionary) for i in _texts)
+            stage_count(files=len(texts), words=_words_count)
+            logtime(f"{package.name} » {len(_texts)} texts » {_words_count} words")
+
+            if state is not None:
+                state.texts[package.name] = _texts_by_file
+
+    if pooled:
+        results = _bundle_in_pool(
+            bundle_jobs,
+            package_me,
+            requested_index,
+            preitems,
+            alltexts,
+            sprites,
+            shared,
+            finish,  # type: ignore
+        )
+
+    if cache is not None:
+        logtime(f"parse cache » {cache}")
+
+    if sprites.cache is not None:
+        sprites.cache.flush()
+        logtime(f"sprite cache » {sprites.cache}")
+
+    logtime(f"texture cache » {_TEXTURE_CACHE}")
+    logtime(f"path index » {_PATH_INDEX}")
+    logtime(f"shared between bundles » {shared}")
 
-    for load_order in package_me:
-        logtime(f"bundling {[p.name for p in load_order]}")
-        bundles.append(init_bundle(load_order, preitems, alltexts))
+    if pooled:
+        return results
+
+    for i, (load_order, bundle, should_localize) in enumerate(
+        zip(package_me, bundles, should_localize_by_bundle)
+    ):
+        localize_bundle(bundle, load_order, alltexts, should_localize)
+
+        for package in load_order:
+            if last_use[package.name] == i:
+                alltexts.pop(package.name, None)
+
+    if finish is not None:
+        return [finish(i, bundle) for i, bundle in zip(requested_index, bundles)]
 
     return bundles
 
 
+# what forked workers of _bundle_in_pool() inherit instead of being sent it
+_FORKED: tuple | None = None
+
+
+def _bundle_in_pool(
+    jobs: int,
+    package_me: list[list[ContentPackage]],
+    requested_index: list[int],
+    preitems: dict[str, dict[Identifier, PreItem]],
+    alltexts: dict[str, list[InfoTexts]],
+    sprites: SpriteOptions,
+    shared: SharedWork,
+    finish: Callable[[int, Bundle], T],
+) -> list[T]:
+    """
+    bundles, localizes, and finishes each load order on a forked process; they
+    share what was parsed by inheriting it, only what finish returns is sent
+    back; the first load order is done here, before forking, so what it has in
+    common with the others is in shared and isn't done again by each process
+
+    >>> _bundle_in_pool(2, [], [], {}, {}, SpriteOptions(), SharedWork(), print)
+    []
+    """
+    global _FORKED
+
+    if not package_me:
+        return []
+
+    _FORKED = (
+        os.getpid(),
+        package_me,
+        requested_index,
+        preitems,
+        alltexts,
+        sprites,
+        shared,
+        finish,
+    )
+
+    try:
+        result, _ = _bundle_forked(0)
+        results = [result]
+
+        forking = get_context("fork")
+        with ProcessPoolExecutor(
+            max_workers=jobs, mp_context=forking, initializer=_start_forked
+        ) as pool:
+            for result, warnings in pool.map(
+                _bundle_forked, range(1, len(package_me))
+            ):
+                _WARNINGS.merge(warnings)
+                results.append(result)
+
+    finally:
+        _FORKED = None
+
+    return results
+
+
+def _start_forked():
+    """forked processes render sprites on threads; the parent's pool isn't
+    usable after forking, and bundles are already spread over processes"""
+    assert _FORKED is not None
+    sprites: SpriteOptions = _FORKED[5]
+    sprites.executor = None
+    sprites.jobs = 0
+
+
+def _bundle_forked(i: int) -> tuple[Any, list[dict]]:
+    """finishes package_me[i], returns that and, if forked, warnings as json"""
+    assert _FORKED is not None
+    (
+        parent,
+        package_me,
+        requested_index,
+        preitems,
+        alltexts,
+        sprites,
+        shared,
+        finish,
+    ) = _FORKED
+    forked = os.getpid() != parent
+
+    if forked:
+        # sent to the parent to print, once if more than one process logs it
+        _WARNINGS.clear()
+        _WARNINGS.quiet = True
+
+    load_order = package_me[i]
+    logtime(f"bundling {[p.name for p in load_order]}")
+    bundle, should_localize = init_bundle(load_order, preitems, sprites, shared)
+    stage("i18n")
+    localize_bundle(bundle, load_order, alltexts, should_localize)
+    result = finish(requested_index[i], bundle)
+
+    if not forked:
+        return result, []
+
+    return result, _WARNINGS.to_json()
+
+
+def preitems_by_identifier(
+    by_file: dict[Path, list[PreItem]]
+) -> dict[Identifier, PreItem]:
+    """a package's items, where a later item replaces an earlier one with the
+    same identifier"""
+    return {
+        preitem.identifier: preitem
+        for preitems in by_file.values()
+        for preitem in preitems
+    }
+
+
+def localize_bundle(
+    bundle: Bundle,
+    load_order: list[ContentPackage],
+    texts_by_package: dict[str, list[InfoTexts]],
+    should_localize: set[str],
+):
+    logtime(f"localizing {bundle}")
+    bundle.i18n = _bundle_i18n(load_order, texts_by_package, should_localize)
+
+    if _CHECK_L10N_MISSING:
+        for language, dictionary in bundle.i18n.items():
+            if not_found := should_localize - set(dictionary.keys()):
+                log_warning(
+                    "l10n not found", language=language, not_found=not_found
+                )
+
+    for lang, dictionary in bundle.i18n.items():
+        logtime(f"{len(dictionary)} in {lang}")
+
+
 def init_bundle(
     load_order: list[ContentPackage],
     preitem_by_package: dict[str, dict[Identifier, PreItem]],
-    texts_by_package: dict[str, list[InfoTexts]],
-) -> Bundle:
+    sprites: SpriteOptions,
+    shared: SharedWork | None = None,
+) -> tuple[Bundle, set[str]]:
+    """returns the bundle, without i18n, and the keys it needs localized"""
 
+    _load_order_names = [package.name for package in load_order]
+
+    stage("variants", load_order=_load_order_names)
     logtime("applying variants")
 
     vanilla = load_order[0]
@@ -1836,20 +4930,24 @@ def init_bundle(
     preitem_by_identifier: dict[Identifier, PreItem]
     preitem_by_identifier = reduce(ior, preitem_layers, {})  # ior is |=,
 
+    if shared is None:
+        shared = SharedWork()
+
     index: dict[Identifier, BaroItem] = {}
-    for identifier, element in log_warnings(apply_variants(preitem_by_identifier)):
-        for baro_item in log_warnings(extract_BaroItem(element)):
+    variants = apply_variants(preitem_by_identifier, shared)
+    for identifier, element in log_warnings(variants):
+        for baro_item in shared.baro_items_of(element):
             index[identifier] = baro_item
 
+    stage_count(items=len(index))
+    stage("processes", load_order=_load_order_names)
     logtime("reading processes from items")
 
     processes: list[Process] = []
 
     for item in index.values():
         xmlpath = preitem_by_identifier[item.identifier].xmlpath
-        processes.extend(
-            tidy_processes(log_warnings(extract_Item(item.element), path=xmlpath))
-        )
+        processes.extend(shared.processes_of(item.element, xmlpath))
 
     # for i, process in enumerate_rev(processes):
     #     for j, other in enumerate_rev(processes[i + 1 :]):
@@ -1861,21 +4959,30 @@ def init_bundle(
     index = retain_only_process_items(index, processes)
 
     logtime(f"retained {len(index)} items; generating sprites")
-
-    sprites_css = _sprite_sheet_css(
-        index.values(), vanilla, package_by_name, preitem_by_identifier
+    stage_count(processes=len(processes), items=len(index))
+    stage("sprites", load_order=_load_order_names)
+
+    sprites_css, sprites_sheets = _sprite_sheet_css(
+        index.values(),
+        vanilla,
+        package_by_name,
+        preitem_by_identifier,
+        sprites,
+        shared,
     )
 
-    logtime(f"sprite sheet {len(sprites_css.getvalue().encode())} bytes")
+    _css_size = len(sprites_css.encode())
+    _sheets_size = sum(map(len, sprites_sheets.values()))
+    logtime(
+        f"sprite sheet {_css_size} bytes"
+        f" » {len(sprites_sheets)} images {_sheets_size} bytes"
+    )
+    stage_count(css_bytes=_css_size, sheets=len(sprites_sheets))
 
+    stage("processes", load_order=_load_order_names)
     should_localize: set[str] = _should_localize_from_processes(processes, index)
     should_localize.update(("$", "fabricatorrequiresrecipe", "random"))
 
-    # {language: {identifier: humantext}}
-    i18n: dict[str, dict[str, str]] = _bundle_i18n(
-        load_order, texts_by_package, should_localize
-    )
-
     # TODO warn about duplicates?
     # if (current := dictionary.get(msg)) is not None and current != child.text:
     #     log_warning(
@@ -1888,16 +4995,8 @@ def init_bundle(
 
     # dictionary[msg] = child.text
 
-    if _CHECK_L10N_MISSING:
-        for language, dictionary in i18n.items():
-            if not_found := should_localize - set(dictionary.keys()):
-                log_warning("l10n not found", language=language, not_found=not_found)
-
-    for lang, dictionary in i18n.items():
-        logtime(f"{len(dictionary)} in {lang}")
-
     # fmt: off
-    return Bundle(
+    bundle = Bundle(
         load_order=[
             BundlePackageMeta(
                 name=package.name,
@@ -1923,93 +5022,238 @@ def init_bundle(
             for identifier, item in index.items()
         ],
         processes=processes,
-        i18n=i18n,
+        i18n={},
         sprites_css=sprites_css,
+        sprites_sheets=sprites_sheets,
     )
     # fmt: on
 
+    return bundle, should_localize
+
 
 def _sprite_sheet_css(
     items: Iterable[BaroItem],
     vanilla: ContentPackage,
     package_by_name: dict[str, ContentPackage],
     preitem_by_identifier: dict[Identifier, PreItem],
-) -> StringIO:
+    sprites: SpriteOptions,
+    shared: SharedWork,
+) -> tuple[str, dict[str, bytes]]:
+    """returns css and, in atlas mode, the sheets it refers to by file name"""
 
-    packages = list(package_by_name.values())
+    packages = by_workshop_id(package_by_name.values())
 
-    sprites_css = StringIO()
+    # items using the same part of the same texture share one sprite
+    #
+    # {(texture path, ltwh): [identifier, ...]}
+    crops: dict[tuple[Path, tuple[int, int, int, int]], list[Identifier]] = {}
 
-    if _CHECK_SPRITE_DUPE:
-        dupes = {}  # type: ignore
+    for item in items:
+        for sprite in log_warnings(extract_Sprite_under(item.element)):
+            break
+        else:
+            log_warning("no sprite found", item=item)
+            continue
 
-    # as of python 3.8, the default max workers maxes out at 32 or something so
-    # it doesn't act stupid on many-core machines
-    with ThreadPoolExecutor() as ex:
-        pending = {}
+        package = package_by_name[sprite.package_name]
+        xmlpath = preitem_by_identifier[item.identifier].xmlpath
 
-        for item in items:
-            for sprite in log_warnings(extract_Sprite_under(item.element)):
-                break
-            else:
-                log_warning("no sprite found", item=item)
+        try:
+            texture_path = resolve_path_with_relative_fallback(
+                sprite.texture,
+                vanilla=vanilla,
+                current=package,
+                packages=packages,
+                fallback=Path(sprite.package_relative_path),
+            )
+        except FileNotFoundError as error:
+            log_warning(
+                "texture not found",
+                error=error,
+                element=sprite.element,
+                path=xmlpath,
+            )
+            continue
+
+        identifiers = crops.setdefault((texture_path, sprite.ltwh), [])
+
+        if _CHECK_SPRITE_DUPE and identifiers:
+            log_warning(
+                "dupe",
+                item=(texture_path, sprite.ltwh, item),
+                dupe=(texture_path, sprite.ltwh, identifiers[0]),
+            )
+
+        identifiers.append(item.identifier)
+
+    format = "png" if sprites.atlas else "webp"
+
+    # {(texture path, ltwh): thumbnail}
+    encoded: dict[tuple[Path, tuple[int, int, int, int]], bytes] = {}
+
+    # {texture path: [ltwh, ...]} not found in the cache
+    misses: dict[Path, list[tuple[int, int, int, int]]] = {}
+
+    for crop in crops:
+        # rendered already for another bundle
+        if (data := shared.sprites.get((*crop, format))) is not None:
+            shared.hits += 1
+            encoded[crop] = data
+            continue
+
+        if sprites.cache is not None:
+            if (data := sprites.cache.get(*crop, format)) is not None:
+                encoded[crop] = shared.sprites[(*crop, format)] = data
                 continue
 
-            package = package_by_name[sprite.package_name]
-            xmlpath = preitem_by_identifier[item.identifier].xmlpath
+        (texture_path, ltwh) = crop
+        misses.setdefault(texture_path, []).append(ltwh)
 
-            try:
-                texture_path = resolve_path_with_relative_fallback(
-                    sprite.texture,
-                    vanilla=vanilla,
-                    current=package,
-                    packages=packages,
-                    fallback=Path(sprite.package_relative_path),
-                )
-            except FileNotFoundError as error:
-                log_warning(
-                    "texture not found",
-                    error=error,
-                    element=sprite.element,
-                    path=xmlpath,
-                )
+    stage_count(sprites=len(crops), rendered=sum(map(len, misses.values())))
 
-            if _CHECK_SPRITE_DUPE:
-                if (texture_path, sprite.ltwh) in dupes:
-                    log_warning(
-                        "dupe",
-                        item=(texture_path, sprite.ltwh, item),
-                        dupe=dupes[(texture_path, sprite.ltwh)],
-                    )
-                else:
-                    dupes[(texture_path, sprite.ltwh)] = (
-                        texture_path,
-                        sprite.ltwh,
-                        item,
-                    )
+    # each texture is one job, so it's decoded once and its sprites are
+    # rendered together
+    ex = sprites.executor or _sprite_executor(sprites.jobs)
 
-            future = ex.submit(_load_base64_sprite_at_path, texture_path, sprite.ltwh)
-            pending[future] = item.identifier
+    try:
+        pending = [
+            (
+                texture_path,
+                ltwhs,
+                ex.submit(render_sprites_at_path, texture_path, ltwhs, format),
+            )
+            for texture_path, ltwhs in misses.items()
+        ]
 
-        for done in as_completed(pending):
-            identifier = pending.pop(done)
+        for texture_path, ltwhs, future in pending:
             try:
-                b64 = done.result()
+                results = future.result()
             except Exception as error:
-                log_warning("_load_sprite_at_path_as_base64", error=error)
-            else:
-                print(
-                    '[data-sprite="%s"] { background: url("data:image/webp;base64,%s") }'
-                    % (identifier, b64),
-                    file=sprites_css,
-                )
+                log_warning("render_sprites_at_path", error=error, path=texture_path)
+                continue
+
+            for ltwh, result in zip(ltwhs, results):
+                if isinstance(result, Exception):
+                    log_warning("render_sprites_at_path", error=result, ltwh=ltwh)
+                    continue
+
+                encoded[texture_path, ltwh] = result
+                shared.sprites[texture_path, ltwh, format] = result
+                shared.misses += 1
+
+                if sprites.cache is not None:
+                    sprites.cache.put(texture_path, ltwh, format, result)
 
-    return sprites_css
+    finally:
+        if ex is not sprites.executor:
+            ex.shutdown()
 
+    loaded = [
+        (identifiers, encoded[crop])
+        for crop, identifiers in crops.items()
+        if crop in encoded
+    ]
+
+    sprites_css = StringIO()
+    sheets: dict[str, bytes] = {}
+
+    if sprites.atlas:
+        from PIL import Image
+
+        # png so that the atlas gets the same pixels whether sprites were
+        # cached or not
+        images = [
+            (identifiers, Image.open(BytesIO(png))) for identifiers, png in loaded
+        ]
+
+        for sheet in chunks(images, ATLAS_SHEET_CELLS):
+            name, webp = _sprite_atlas_sheet(sheet, sprites_css)
+            sheets[name] = webp
+
+    else:
+        for identifiers, webp in loaded:
+            print(
+                '%s { background: url("data:image/webp;base64,%s") }'
+                % (_sprite_selector(identifiers), b64encode(webp).decode()),
+                file=sprites_css,
+            )
+
+    # a str, StringIO.getvalue() keeps a copy four bytes per character
+    return sprites_css.getvalue(), sheets
+
+
+def _sprite_executor(processes: int) -> Executor:
+    if processes > 1:
+        return ProcessPoolExecutor(max_workers=processes)
+
+    # as of python 3.8, the default max workers maxes out at 32 or something so
+    # it doesn't act stupid on many-core machines
+    return ThreadPoolExecutor()
+
+
+def _sprite_selector(identifiers: list[Identifier], prefix="") -> str:
+    return ", ".join(f'{prefix}[data-sprite="{i}"]' for i in identifiers)
+
+
+# webp images can't be wider than 16383 pixels
+ATLAS_SHEET_CELLS = 256
+# the width of the box the web page shows a sprite in, web/assets/style.css
+ATLAS_CELL_SIZE = 48
+
+
+def _sprite_atlas_sheet(
+    sprites: list[tuple[list[Identifier], "PIL.Image.Image"]], css: StringIO
+) -> tuple[str, bytes]:
+    """
+    pack sprites into one row of square cells in a webp image; write css rules
+    to css and return the image's file name & contents
+
+    the web page sizes sprites with background-size: contain in a box
+    ATLAS_CELL_SIZE wide; a sheet can't do that, instead the sheet is scaled
+    to the box's height and each cell is centered in the box with calc()
+
+    >>> from PIL import Image
+    >>> css = StringIO()
+    >>> cells = [([i], Image.new("RGBA", (8, 8))) for i in "ab"]
+    >>> _ = _sprite_atlas_sheet(cells, css)
+    >>> for line in css.getvalue().splitlines()[1:]:
+    ...     print(line)
+    .sprite[data-sprite="a"] { background-position-x: calc(25% + 12px) }
+    .sprite[data-sprite="b"] { background-position-x: calc(75% + -12px) }
+    """
+    from PIL import Image
+
+    size = ATLAS_CELL_SIZE
+    n = len(sprites)
+    atlas = Image.new("RGBA", (size * n, size))
+
+    for i, (_, image) in enumerate(sprites):
+        (w, h) = image.size
+        box = (i * size + (size - w) // 2, (size - h) // 2)
+        atlas.paste(image.convert("RGBA"), box)
+
+    buf = BytesIO()
+    atlas.save(buf, format="webp")
+    webp = buf.getvalue()
+    name = f"sprites-{sha1(webp).hexdigest()[:16]}.webp"
+
+    everything = list(chain.from_iterable(identifiers for identifiers, _ in sprites))
+    print(
+        '%s { background: url("%s") 50%% 50%% / auto 100%% no-repeat }'
+        % (_sprite_selector(everything, prefix=".sprite"), name),
+        file=css,
+    )
+
+    for i, (identifiers, _) in enumerate(sprites):
+        p = (i + 0.5) / n
+        selector = _sprite_selector(identifiers, prefix=".sprite")
+        print(
+            "%s { background-position-x: calc(%.6g%% + %.6gpx) }"
+            % (selector, 100 * p, size * (0.5 - p)),
+            file=css,
+        )
 
-def _load_base64_sprite_at_path(path: Path, ltwh: tuple[int, int, int, int]):
-    image = load_sprite_at_path(path, ltwh)
-    return to_base64(image)
+    return name, webp
 
 
 def _should_localize_from_processes(